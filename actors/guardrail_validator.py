@@ -15,7 +15,7 @@ from typing import Any, Dict, List, Optional
 
 import litellm
 from models.message import MessagePayload
-from storage.sqlite_client import get_sqlite_client
+from storage.sqlite_client import flush_sqlite, get_sqlite_client
 
 from actors.base import ProcessorActor
 
@@ -129,6 +129,14 @@ class GuardrailValidator(ProcessorActor):
                 "error": str(e),
             }
 
+    async def stop(self) -> None:
+        """Stop the actor and persist messages still buffered for SQLite."""
+        await super().stop()
+        try:
+            await flush_sqlite()
+        except Exception as e:
+            self.logger.error(f"Failed to flush buffered messages to SQLite: {e}")
+
     async def _log_validation_to_sqlite(self, payload: MessagePayload, validation_result: Dict[str, Any]) -> None:
         """
         Log validation results to SQLite for audit trail.
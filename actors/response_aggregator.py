@@ -12,7 +12,7 @@ from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
 from models.message import Message, MessagePayload
-from storage.sqlite_client import get_sqlite_client
+from storage.sqlite_client import flush_sqlite, get_sqlite_client
 
 from actors.base import BaseActor
 
@@ -120,6 +120,14 @@ class ResponseAggregator(BaseActor):
 
         return response_data
 
+    async def stop(self) -> None:
+        """Stop the actor and persist messages still buffered for SQLite."""
+        await super().stop()
+        try:
+            await flush_sqlite()
+        except Exception as e:
+            self.logger.error(f"Failed to flush buffered messages to SQLite: {e}")
+
     async def _log_conversation_to_sqlite(self, payload: MessagePayload, response_data: Dict[str, Any]) -> None:
         """
         Log conversation to SQLite for persistence and analytics.
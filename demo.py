@@ -59,7 +59,7 @@ from actors.response_generator import create_response_generator
 from actors.sentiment_analyzer import create_sentiment_analyzer
 from models.message import Message, MessagePayload, Route, StandardRoutes
 from storage.redis_client_simple import init_simplified_redis
-from storage.sqlite_client import init_sqlite
+from storage.sqlite_client import close_sqlite, init_sqlite
 
 
 class ComprehensiveActorMeshDemo:
@@ -817,6 +817,9 @@ async def main():
     except Exception as e:
         demo.print_error(f"\n❌ Demonstration failed: {str(e)}")
         return 1
+    finally:
+        # Buffered conversation messages are only persisted once flushed.
+        await close_sqlite()
 
 
 if __name__ == "__main__":
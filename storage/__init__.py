@@ -6,5 +6,5 @@ from .redis_client_simple import (  # noqa: F401
     get_simplified_redis_client,
     init_simplified_redis,
 )
-from .sqlite_client import SQLiteClient, get_sqlite_client, init_sqlite  # noqa: F401
+from .sqlite_client import SQLiteClient, close_sqlite, flush_sqlite, get_sqlite_client, init_sqlite  # noqa: F401
 
@@ -4,14 +4,67 @@ Redis storage client for session and context data.
 Provides thin async wrappers around Redis operations used by the actors and tests.
 """
 
-import datetime
-import inspect
-import json
+import os
+import time
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
+import msgpack
+import orjson
 import redis.asyncio as redis
+import zstandard as zstd
 from pydantic import BaseModel, Field
 
+# Counts keys per prefix for one SCAN page, so housekeeping streams back counters instead
+# of key names while Redis stays free to serve other clients between pages.
+# ARGV[1] is the cursor and ARGV[2..] the prefixes; returns {next_cursor, counts}.
+_COUNT_PREFIXES_LUA = """
+local reply = redis.call("SCAN", ARGV[1], "COUNT", 1000)
+local counts = {}
+for i = 2, #ARGV do
+    counts[i - 1] = 0
+end
+for _, key in ipairs(reply[2]) do
+    for i = 2, #ARGV do
+        if string.sub(key, 1, #ARGV[i]) == ARGV[i] then
+            counts[i - 1] = counts[i - 1] + 1
+            break
+        end
+    end
+end
+return {reply[1], counts}
+"""
+
+# Counting a message only touches the stats hash; the session blob just has its TTL refreshed.
+# The hash also carries customer_email, returned alongside the count so the caller can keep
+# the customer's session index alive: Redis requires every key a script touches to be
+# declared in KEYS, and the index name isn't known until the script has run.
+_INCREMENT_MESSAGE_COUNT_LUA = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return {0, ""}
+end
+local seed_count = redis.call("HEXISTS", KEYS[2], "message_count") == 0
+local email = redis.call("HGET", KEYS[2], "customer_email")
+if seed_count or not email then
+    -- Session stored before the stats hash carried these fields: seed them from its blob.
+    local ok, session = pcall(cjson.decode, redis.call("GET", KEYS[1]))
+    if ok and type(session) == "table" then
+        if seed_count then
+            redis.call("HSET", KEYS[2], "message_count", tonumber(session.message_count) or 0)
+        end
+        if type(session.customer_email) == "string" then
+            email = session.customer_email
+            redis.call("HSET", KEYS[2], "customer_email", email)
+        end
+    end
+end
+local count = redis.call("HINCRBY", KEYS[2], "message_count", 1)
+redis.call("HSET", KEYS[2], "last_activity", ARGV[1])
+redis.call("EXPIRE", KEYS[2], ARGV[2])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return {count, email or ""}
+"""
+
 
 class SessionState(BaseModel):
     """Lightweight session model stored in Redis."""
@@ -25,6 +78,33 @@ class SessionState(BaseModel):
     status: str = "active"
 
 
+_SESSION_FIELDS = frozenset(SessionState.model_fields)
+
+# Context blobs above this size are zstd-compressed and tagged with a leading marker
+# byte. A packed dict always starts with a map header (0x80-0x8f, 0xde or 0xdf), so
+# untagged values, including ones cached before compression existed, stay readable.
+CONTEXT_COMPRESS_THRESHOLD = 1024
+_ZSTD_MARKER = b"\x01"
+_ZSTD_COMPRESSOR = zstd.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstd.ZstdDecompressor()
+
+
+def pack_context(context: Dict[str, Any]) -> bytes:
+    """Serialize a customer context to MessagePack, compressing large payloads."""
+    data = msgpack.packb(context, use_bin_type=True)
+    if len(data) < CONTEXT_COMPRESS_THRESHOLD:
+        return data
+    return _ZSTD_MARKER + _ZSTD_COMPRESSOR.compress(data)
+
+
+def unpack_context(data: bytes) -> Dict[str, Any]:
+    """Inverse of pack_context."""
+    if data[:1] == _ZSTD_MARKER:
+        data = _ZSTD_DECOMPRESSOR.decompress(data[1:])
+    # strict_map_key=False: msgpack otherwise refuses to unpack the int/None keys it packed.
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
 class RedisClient:
     """Async Redis client with helpers for session/context storage."""
 
@@ -32,82 +112,91 @@ class RedisClient:
     CONTEXT_PREFIX = "context:"
     TEMP_PREFIX = "temp:"
     COUNTER_PREFIX = "counter:"
+    CUSTOMER_SESSIONS_PREFIX = "customer_sessions:"
+    SESSION_STATS_PREFIX = "session_stats:"
+    # Unix time the first indexed session was created; sessions from before then aren't indexed.
+    SESSION_INDEX_SINCE_KEY = "customer_sessions_since"
 
     SESSION_TTL = 3600 * 24  # 24 hours
     CONTEXT_TTL = 3600 * 2   # 2 hours
     TEMP_TTL = 300           # 5 minutes
 
-    def __init__(self, redis_url: str = "redis://localhost:6379", db: int = 0) -> None:
-        self.redis_url = redis_url
+    POOL_TIMEOUT = 5         # seconds to wait for a free pooled connection
+
+    def __init__(self, redis_url: Optional[str] = None, db: int = 0, max_connections: int = 64) -> None:
+        # Falls back to $REDIS_URL; a unix:///path/to/redis.sock URL selects the socket transport.
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
         self.db = db
+        self.max_connections = max_connections
         self.redis: Optional[redis.Redis] = None
+        # Context blobs are MessagePack bytes, so they go through a handle that skips str decoding.
+        self.binary_redis: Optional[redis.Redis] = None
+        self._scripts: Dict[str, Any] = {}
+
+    def _create_pool(self, decode_responses: bool) -> redis.BlockingConnectionPool:
+        """Build a connection pool for this client's URL and database."""
+        # Commands from concurrent coroutines each check out their own connection; once
+        # max_connections are busy, callers wait up to POOL_TIMEOUT instead of failing.
+        return redis.BlockingConnectionPool.from_url(
+            self.redis_url,
+            db=self.db,
+            decode_responses=decode_responses,
+            max_connections=self.max_connections,
+            timeout=self.POOL_TIMEOUT,
+        )
 
     async def connect(self) -> None:
         """Create a Redis connection."""
-        self.redis = redis.from_url(self.redis_url, db=self.db, decode_responses=True)
+        self.redis = redis.Redis.from_pool(self._create_pool(decode_responses=True))
+        self.binary_redis = redis.Redis.from_pool(self._create_pool(decode_responses=False))
+        self._scripts = {}
         await self.redis.ping()
 
     async def disconnect(self) -> None:
         """Close Redis connection."""
+        if self.binary_redis:
+            await self.binary_redis.aclose()
+            self.binary_redis = None
         if self.redis:
             await self.redis.aclose()
             self.redis = None
+            self._scripts = {}
 
     async def _ensure_connected(self) -> None:
         """Ensure a Redis connection exists."""
         if self.redis is None:
             await self.connect()
 
+    def _script(self, name: str, source: str) -> Any:
+        """Return a Lua script registered against the current connection (EVALSHA with EVAL fallback)."""
+        script = self._scripts.get(name)
+        if script is None:
+            script = self.redis.register_script(source)  # type: ignore[union-attr]
+            self._scripts[name] = script
+        return script
+
     # Key helpers
     def _session_key(self, session_id: str) -> str:
-        return f"{self.SESSION_PREFIX}{session_id}"
+        return self.SESSION_PREFIX + session_id
 
     def _context_key(self, customer_email: str) -> str:
-        return f"{self.CONTEXT_PREFIX}{customer_email}"
+        return self.CONTEXT_PREFIX + customer_email
 
     def _temp_key(self, key: str) -> str:
-        return f"{self.TEMP_PREFIX}{key}"
+        return self.TEMP_PREFIX + key
 
     def _counter_key(self, key: str) -> str:
-        return f"{self.COUNTER_PREFIX}{key}"
-
-    def _now_iso(self) -> str:
-        """
-        Return current timestamp in ISO format.
-
-        Handles pytest patching of the datetime module by coercing any mock return value to str.
-        """
-        try:
-            now_value = datetime.now()
-            result = now_value.isoformat() if hasattr(now_value, "isoformat") else now_value
-        except Exception:
-            result = datetime.datetime.now().isoformat()
+        return self.COUNTER_PREFIX + key
 
-        return result if isinstance(result, str) else str(result)
+    def _customer_sessions_key(self, customer_email: str) -> str:
+        return self.CUSTOMER_SESSIONS_PREFIX + customer_email
 
-    def _utcnow_iso(self) -> str:
-        """
-        Return current UTC timestamp in ISO format.
+    def _session_stats_key(self, session_id: str) -> str:
+        return self.SESSION_STATS_PREFIX + session_id
 
-        Falls back to the real datetime module if the local datetime is patched/mocked.
-        """
-        candidates = [
-            lambda: getattr(datetime, "utcnow", None) and datetime.utcnow(),
-            lambda: getattr(datetime, "datetime", datetime.datetime).utcnow(),
-            lambda: __import__("datetime").datetime.utcnow(),
-        ]
-
-        for candidate in candidates:
-            try:
-                value = candidate()
-                if value is None:
-                    continue
-                result = value.isoformat() if hasattr(value, "isoformat") else value
-                return result if isinstance(result, str) else str(result)
-            except Exception:
-                continue
-
-        return datetime.datetime.utcnow().isoformat()
+    def _now_iso(self) -> str:
+        """Return current timestamp in ISO format."""
+        return datetime.now().isoformat()
 
     # Session operations
     async def create_session(self, session_id: str, customer_email: str, context: Optional[Dict[str, Any]] = None) -> SessionState:
@@ -115,77 +204,141 @@ class RedisClient:
         await self._ensure_connected()
         now = self._now_iso()
 
-        session = SessionState(
-            session_id=session_id,
-            customer_email=customer_email,
-            created_at=now,
-            last_activity=now,
-            context=context or {},
-        )
+        # Encode the plain record with orjson rather than going through model_dump_json.
+        record = {
+            "session_id": session_id,
+            "customer_email": customer_email,
+            "created_at": now,
+            "last_activity": now,
+            "context": context or {},
+            "message_count": 0,
+            "status": "active",
+        }
 
-        await self.redis.setex(self._session_key(session_id), self.SESSION_TTL, session.model_dump_json())  # type: ignore[union-attr]
-        return session
+        index_key = self._customer_sessions_key(customer_email)
+        stats_key = self._session_stats_key(session_id)
+        async with self.redis.pipeline() as pipe:  # type: ignore[union-attr]
+            pipe.set(self._session_key(session_id), _dump_json(record), ex=self.SESSION_TTL)
+            pipe.hset(
+                stats_key, mapping={"message_count": 0, "last_activity": now, "customer_email": customer_email}
+            )
+            pipe.expire(stats_key, self.SESSION_TTL)
+            pipe.sadd(index_key, session_id)
+            pipe.expire(index_key, self.SESSION_TTL)
+            pipe.set(self.SESSION_INDEX_SINCE_KEY, int(time.time()), nx=True)
+            await pipe.execute()
+
+        return SessionState.model_validate(record)
 
     async def get_session(self, session_id: str) -> Optional[SessionState]:
         """Fetch a session by id."""
         await self._ensure_connected()
-        data = await self.redis.get(self._session_key(session_id))  # type: ignore[union-attr]
+        async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+            pipe.get(self._session_key(session_id))
+            pipe.hgetall(self._session_stats_key(session_id))
+            data, stats = await pipe.execute()
 
-        if not data:
-            return None
-
-        try:
-            return SessionState.model_validate_json(data)
-        except Exception:
-            return None
+        return _load_session(data, stats)
 
     async def update_session(self, session_id: str, **updates: Any) -> bool:
         """Update session fields and refresh TTL."""
         await self._ensure_connected()
-        session = await self.get_session(session_id)
-        if not session:
-            return False
-
-        for field, value in updates.items():
-            if value is not None and hasattr(session, field):
-                setattr(session, field, value)
-
-        session.last_activity = self._now_iso()
+        fields = {
+            field: value for field, value in updates.items() if value is not None and field in _SESSION_FIELDS
+        }
+        session_key = self._session_key(session_id)
+        stats_key = self._session_stats_key(session_id)
+        now = self._now_iso()
 
-        await self.redis.setex(self._session_key(session_id), self.SESSION_TTL, session.model_dump_json())  # type: ignore[union-attr]
-        return True
+        # The blob is merged here with orjson rather than in a Lua script: Redis's cjson
+        # rewrites [] as {} and rounds numbers to 14 digits, corrupting untouched context
+        # values. WATCH makes the transaction retry if the blob changes under us.
+        async def merge(pipe: Any) -> bool:
+            raw = await pipe.get(session_key)
+            if not raw:
+                return False
+            try:
+                record = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                return False
+            if not isinstance(record, dict):
+                return False
+            record.update(fields)
+            record["last_activity"] = now
+
+            stats = {"last_activity": now}
+            if "message_count" in fields:
+                stats["message_count"] = fields["message_count"]
+            customer_email = record.get("customer_email")
+            if isinstance(customer_email, str):
+                stats["customer_email"] = customer_email
+
+            pipe.multi()
+            pipe.set(session_key, _dump_json(record), ex=self.SESSION_TTL)
+            # Sessions stored before stats hashes existed carry their count only in the blob;
+            # seed it so a later HINCRBY continues from there instead of restarting at 1.
+            pipe.hsetnx(stats_key, "message_count", record.get("message_count", 0))
+            pipe.hset(stats_key, mapping=stats)
+            pipe.expire(stats_key, self.SESSION_TTL)
+            # An active session keeps its customer's index alive along with itself.
+            if isinstance(customer_email, str):
+                pipe.expire(self._customer_sessions_key(customer_email), self.SESSION_TTL)
+            return True
+
+        return await self.redis.transaction(merge, session_key, value_from_callable=True)  # type: ignore[union-attr]
 
     async def increment_message_count(self, session_id: str) -> int:
         """Increment message count for a session."""
         await self._ensure_connected()
-        session = await self.get_session(session_id)
-        if not session:
-            return 0
-
-        session.message_count += 1
-        session.last_activity = self._now_iso()
-
-        await self.redis.setex(self._session_key(session_id), self.SESSION_TTL, session.model_dump_json())  # type: ignore[union-attr]
-        return session.message_count
+        increment = self._script("increment_message_count", _INCREMENT_MESSAGE_COUNT_LUA)
+        count, customer_email = await increment(
+            keys=[self._session_key(session_id), self._session_stats_key(session_id)],
+            args=[self._now_iso(), self.SESSION_TTL],
+        )
+        if customer_email:
+            # An active session keeps its customer's index alive along with itself.
+            index_key = self._customer_sessions_key(customer_email)
+            await self.redis.expire(index_key, self.SESSION_TTL)  # type: ignore[union-attr]
+        return int(count)
 
     async def delete_session(self, session_id: str) -> bool:
         """Delete a session."""
         await self._ensure_connected()
-        result = await self.redis.delete(self._session_key(session_id))  # type: ignore[union-attr]
-        return bool(result)
+        session_key = self._session_key(session_id)
+
+        # The session's customer index is named after the customer_email inside the blob, so
+        # read it under WATCH and drop the session, its stats hash and its index entry together.
+        async def remove(pipe: Any) -> None:
+            customer_email = _customer_email(await pipe.get(session_key))
+            pipe.multi()
+            pipe.delete(session_key)
+            pipe.delete(self._session_stats_key(session_id))
+            if customer_email:
+                pipe.srem(self._customer_sessions_key(customer_email), session_id)
+
+        deleted, *_ = await self.redis.transaction(remove, session_key)  # type: ignore[union-attr]
+        return bool(deleted)
 
     # Context operations
     async def set_context(self, customer_email: str, context: Dict[str, Any], ttl: Optional[int] = None) -> None:
         """Set customer context with TTL."""
         await self._ensure_connected()
-        data = json.dumps(context)
-        await self.redis.setex(self._context_key(customer_email), ttl or self.CONTEXT_TTL, data)  # type: ignore[union-attr]
+        data = pack_context(context)
+        await self.binary_redis.set(self._context_key(customer_email), data, ex=ttl or self.CONTEXT_TTL)  # type: ignore[union-attr]
 
     async def get_context(self, customer_email: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached customer context."""
         await self._ensure_connected()
-        data = await self.redis.get(self._context_key(customer_email))  # type: ignore[union-attr]
-        return json.loads(data) if data else None
+        key = self._context_key(customer_email)
+        data = await self.binary_redis.get(key)  # type: ignore[union-attr]
+        if not data:
+            return None
+        try:
+            return unpack_context(data)
+        except Exception:
+            # Undecodable (e.g. JSON cached before the MessagePack switch): drop it as a miss.
+            await self.binary_redis.delete(key)  # type: ignore[union-attr]
+            return None
 
     async def update_context(self, customer_email: str, updates: Dict[str, Any]) -> None:
         """Merge updates into existing context (or create new)."""
@@ -205,10 +358,10 @@ class RedisClient:
         """Store temporary data with optional TTL."""
         await self._ensure_connected()
         if isinstance(data, (dict, list)):
-            value = json.dumps(data)
+            value = _dump_json(data)
         else:
             value = str(data)
-        await self.redis.setex(self._temp_key(key), ttl or self.TEMP_TTL, value)  # type: ignore[union-attr]
+        await self.redis.set(self._temp_key(key), value, ex=ttl or self.TEMP_TTL)  # type: ignore[union-attr]
 
     async def get_temp_data(self, key: str) -> Optional[str]:
         """Retrieve temporary data as stored."""
@@ -242,40 +395,73 @@ class RedisClient:
     async def get_sessions_by_customer(self, customer_email: str) -> List[SessionState]:
         """List sessions matching a customer email."""
         await self._ensure_connected()
-        sessions: List[SessionState] = []
-
-        async for key in _iterate_async(self.redis.scan_iter(f"{self.SESSION_PREFIX}*")):  # type: ignore[union-attr]
-            data = await self.redis.get(key)  # type: ignore[union-attr]
-            if not data:
-                continue
-            try:
-                session = SessionState.model_validate_json(data)
-                if session.customer_email == customer_email:
-                    sessions.append(session)
-            except Exception:
-                continue
+        index_key = self._customer_sessions_key(customer_email)
+        session_prefix = self.SESSION_PREFIX
+        stats_prefix = self.SESSION_STATS_PREFIX
+        session_ids = list(await self.redis.smembers(index_key))  # type: ignore[union-attr]
+        backfill = False
+        if not session_ids:
+            if not await self._index_may_miss_sessions():
+                return []
+            # Sessions created before the index existed may still be alive: find them by SCAN
+            # and add them to the index so later lookups don't have to.
+            session_ids = [
+                key[len(session_prefix):]
+                async for key in self.redis.scan_iter(match=session_prefix + "*", count=1000)  # type: ignore[union-attr]
+            ]
+            if not session_ids:
+                return []
+            backfill = True
+        async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+            pipe.mget([session_prefix + session_id for session_id in session_ids])
+            for session_id in session_ids:
+                pipe.hgetall(stats_prefix + session_id)
+            values, *stats = await pipe.execute()
+
+        # Sessions expire by TTL without touching the index, so prune ids whose blob is gone.
+        expired = [session_id for session_id, data in zip(session_ids, values) if data is None]
+        if expired:
+            await self.redis.srem(index_key, *expired)  # type: ignore[union-attr]
 
+        sessions: List[SessionState] = []
+        for data, session_stats in zip(values, stats):
+            session = _load_session(data, session_stats)
+            if session is not None and session.customer_email == customer_email:
+                sessions.append(session)
+
+        if backfill and sessions:
+            async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+                pipe.sadd(index_key, *(session.session_id for session in sessions))
+                pipe.expire(index_key, self.SESSION_TTL)
+                await pipe.execute()
         return sessions
 
+    async def _index_may_miss_sessions(self) -> bool:
+        """Return whether sessions created before the customer index existed could still be alive."""
+        since = await self.redis.get(self.SESSION_INDEX_SINCE_KEY)  # type: ignore[union-attr]
+        return since is None or time.time() - float(since) < self.SESSION_TTL
+
     async def cleanup_expired_data(self) -> Dict[str, int]:
         """Count active keys for housekeeping metrics."""
         await self._ensure_connected()
 
-        counts = {
-            "sessions_active": 0,
-            "contexts_active": 0,
-            "temp_data_active": 0,
+        prefixes = [self.SESSION_PREFIX, self.CONTEXT_PREFIX, self.TEMP_PREFIX]
+        count_prefixes = self._script("count_prefixes", _COUNT_PREFIXES_LUA)
+        totals = [0] * len(prefixes)
+        cursor = "0"
+        while True:
+            cursor, counts = await count_prefixes(args=[cursor, *prefixes])
+            totals = [total + int(count) for total, count in zip(totals, counts)]
+            if str(cursor) == "0":
+                break
+
+        sessions, contexts, temp_data = totals
+        return {
+            "sessions_active": sessions,
+            "contexts_active": contexts,
+            "temp_data_active": temp_data,
         }
 
-        async for _ in _iterate_async(self.redis.scan_iter(f"{self.SESSION_PREFIX}*")):  # type: ignore[union-attr]
-            counts["sessions_active"] += 1
-        async for _ in _iterate_async(self.redis.scan_iter(f"{self.CONTEXT_PREFIX}*")):  # type: ignore[union-attr]
-            counts["contexts_active"] += 1
-        async for _ in _iterate_async(self.redis.scan_iter(f"{self.TEMP_PREFIX}*")):  # type: ignore[union-attr]
-            counts["temp_data_active"] += 1
-
-        return counts
-
     async def flushdb(self) -> None:
         """Flush current Redis database."""
         await self._ensure_connected()
@@ -287,11 +473,12 @@ class RedisClient:
             await self._ensure_connected()
 
             test_key = "healthcheck:test"
-            await self.redis.set(test_key, "ok")  # type: ignore[union-attr]
-            test_value = await self.redis.get(test_key)  # type: ignore[union-attr]
-            await self.redis.delete(test_key)  # type: ignore[union-attr]
-
-            info = await self.redis.info()  # type: ignore[union-attr]
+            async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+                pipe.set(test_key, "ok")
+                pipe.get(test_key)
+                pipe.delete(test_key)
+                pipe.info()
+                _, test_value, _, info = await pipe.execute()
 
             return {
                 "status": "healthy",
@@ -312,20 +499,33 @@ class RedisClient:
 redis_client = RedisClient()
 
 
-async def _iterate_async(iterable_or_awaitable):
-    """
-    Normalize async iteration over Redis scan_iter which may be an async generator or awaitable.
-    """
-    iterator = iterable_or_awaitable
-    if inspect.isawaitable(iterator):
-        iterator = await iterator
+def _dump_json(value: Any) -> bytes:
+    """Encode JSON with orjson, stringifying non-str dict keys the way json.dumps does."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
 
-    if hasattr(iterator, "__aiter__"):
-        async for item in iterator:
-            yield item
-    else:
-        for item in iterator:
-            yield item
+def _customer_email(data: Optional[str]) -> Optional[str]:
+    """Return the customer_email stored in a session blob, if it can be read."""
+    try:
+        record = orjson.loads(data) if data else None
+    except orjson.JSONDecodeError:
+        return None
+    email = record.get("customer_email") if isinstance(record, dict) else None
+    return email if isinstance(email, str) else None
+
+
+def _load_session(data: Optional[str], stats: Optional[Dict[str, str]]) -> Optional[SessionState]:
+    """Build a SessionState from its JSON blob, overlaying the live counters from its stats hash."""
+    if not data:
+        return None
+    try:
+        if not stats:
+            return SessionState.model_validate_json(data)
+        record = orjson.loads(data)
+        record.update(stats)
+        return SessionState.model_validate(record)
+    except Exception:
+        return None
 
 
 async def get_redis_client() -> RedisClient:
@@ -335,8 +535,8 @@ async def get_redis_client() -> RedisClient:
     return redis_client
 
 
-async def init_redis(redis_url: str = "redis://localhost:6379") -> RedisClient:
-    """Initialize and connect a new Redis client with custom URL."""
+async def init_redis(redis_url: Optional[str] = None) -> RedisClient:
+    """Initialize and connect a new Redis client with custom URL (defaults to $REDIS_URL)."""
     global redis_client
     redis_client = RedisClient(redis_url)
     await redis_client.connect()
@@ -2,26 +2,41 @@
 Simplified Redis client focused on customer context caching.
 """
 
-import json
+import os
 from typing import Any, Dict, Optional
 
 import redis.asyncio as redis
 
+from .redis_client import pack_context, unpack_context
+
 
 class SimplifiedRedisClient:
     """Minimal Redis helper used by the ContextRetriever actor."""
 
     CONTEXT_PREFIX = "context:"
     CONTEXT_TTL = 3600 * 2  # 2 hours
+    POOL_TIMEOUT = 5  # seconds to wait for a free pooled connection
 
-    def __init__(self, redis_url: str = "redis://localhost:6379", db: int = 0) -> None:
-        self.redis_url = redis_url
+    def __init__(self, redis_url: Optional[str] = None, db: int = 0, max_connections: int = 64) -> None:
+        # Falls back to $REDIS_URL; a unix:///path/to/redis.sock URL selects the socket transport.
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
         self.db = db
+        self.max_connections = max_connections
         self.redis: Optional[redis.Redis] = None
 
     async def connect(self) -> None:
         """Establish a Redis connection."""
-        self.redis = redis.from_url(self.redis_url, db=self.db, decode_responses=True)
+        # Commands from concurrent coroutines each check out their own connection; once
+        # max_connections are busy, callers wait up to POOL_TIMEOUT instead of failing.
+        # Responses stay as bytes because cached contexts are MessagePack blobs.
+        pool = redis.BlockingConnectionPool.from_url(
+            self.redis_url,
+            db=self.db,
+            decode_responses=False,
+            max_connections=self.max_connections,
+            timeout=self.POOL_TIMEOUT,
+        )
+        self.redis = redis.Redis.from_pool(pool)
         await self.redis.ping()
 
     async def disconnect(self) -> None:
@@ -35,13 +50,13 @@ class SimplifiedRedisClient:
             await self.connect()
 
     def _context_key(self, customer_email: str) -> str:
-        return f"{self.CONTEXT_PREFIX}{customer_email}"
+        return self.CONTEXT_PREFIX + customer_email
 
     async def cache_customer_context(self, customer_email: str, context_data: Dict[str, Any], ttl: Optional[int] = None) -> None:
-        """Cache customer context JSON."""
+        """Cache customer context as MessagePack, zstd-compressed when large."""
         await self._ensure_connected()
-        data = json.dumps(context_data)
-        await self.redis.setex(self._context_key(customer_email), ttl or self.CONTEXT_TTL, data)  # type: ignore[union-attr]
+        data = pack_context(context_data)
+        await self.redis.set(self._context_key(customer_email), data, ex=ttl or self.CONTEXT_TTL)  # type: ignore[union-attr]
 
     async def get_customer_context(self, customer_email: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached customer context if available."""
@@ -50,7 +65,7 @@ class SimplifiedRedisClient:
         if raw is None:
             return None
         try:
-            return json.loads(raw)
+            return unpack_context(raw)
         except Exception:
             await self.redis.delete(self._context_key(customer_email))  # type: ignore[union-attr]
             return None
@@ -78,15 +93,16 @@ class SimplifiedRedisClient:
             await self._ensure_connected()
 
             test_key = "healthcheck:simple"
-            await self.redis.set(test_key, "ok")  # type: ignore[union-attr]
-            test_value = await self.redis.get(test_key)  # type: ignore[union-attr]
-            await self.redis.delete(test_key)  # type: ignore[union-attr]
-
-            info = await self.redis.info()  # type: ignore[union-attr]
+            async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+                pipe.set(test_key, "ok")
+                pipe.get(test_key)
+                pipe.delete(test_key)
+                pipe.info()
+                _, test_value, _, info = await pipe.execute()
 
             return {
                 "status": "healthy",
-                "test_passed": test_value == "ok",
+                "test_passed": test_value == b"ok",
                 "connected_clients": info.get("connected_clients"),
                 "used_memory": info.get("used_memory_human") or info.get("used_memory"),
                 "uptime": info.get("uptime_in_seconds"),
@@ -110,8 +126,8 @@ async def get_simplified_redis_client() -> SimplifiedRedisClient:
     return simplified_redis_client
 
 
-async def init_simplified_redis(redis_url: str = "redis://localhost:6379") -> SimplifiedRedisClient:
-    """Initialize a new simplified client with custom URL."""
+async def init_simplified_redis(redis_url: Optional[str] = None) -> SimplifiedRedisClient:
+    """Initialize a new simplified client with custom URL (defaults to $REDIS_URL)."""
     global simplified_redis_client
     simplified_redis_client = SimplifiedRedisClient(redis_url)
     await simplified_redis_client.connect()
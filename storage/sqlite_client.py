@@ -2,20 +2,88 @@
 Async SQLite client for logging conversations and messages.
 """
 
+import asyncio
 import datetime
-import json
+import logging
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import sqlite3
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import aiosqlite
+import orjson
+
+# SQL lives in module constants so every call passes the identical text; sqlite3 keeps a
+# per-connection cache of prepared statements keyed on that text, so each is parsed once.
+_CREATE_CONVERSATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS conversations (
+    session_id TEXT PRIMARY KEY,
+    status TEXT,
+    issue_type TEXT,
+    sentiment TEXT,
+    created_at TEXT,
+    updated_at TEXT
+)
+"""
+
+_CREATE_MESSAGES_SQL = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    message_id TEXT,
+    customer_email TEXT,
+    message_type TEXT,
+    content TEXT,
+    metadata BLOB,
+    created_at TEXT
+)
+"""
+
+_CREATE_INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at)",
+)
+
+_INSERT_MESSAGE_SQL = """
+INSERT INTO messages (session_id, message_id, customer_email, message_type, content, metadata, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SELECT_SESSION_MESSAGES_SQL = """
+SELECT message_id, customer_email, message_type, content, metadata, created_at
+FROM messages
+WHERE session_id = ?
+ORDER BY created_at, id
+"""
+
+_UPSERT_CONVERSATION_SQL = """
+INSERT INTO conversations (session_id, status, issue_type, sentiment, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET
+    status=excluded.status,
+    issue_type=excluded.issue_type,
+    sentiment=excluded.sentiment,
+    updated_at=excluded.updated_at
+"""
+
+# Python types sqlite3 binds natively (bool is an int subclass).
+_BINDABLE_TYPES = (str, int, float, bytes, bytearray, memoryview, type(None))
+
+logger = logging.getLogger(__name__)
 
 
 class SQLiteClient:
     """Lightweight wrapper around aiosqlite for conversation storage."""
 
+    FLUSH_BATCH_SIZE = 256  # buffered messages that trigger an immediate flush
+    FLUSH_INTERVAL = 0.5    # seconds between background flushes
+    MAX_BUFFERED_MESSAGES = 10_000  # rows kept for retry while the database is failing
+
     def __init__(self, db_path: str = "data/conversations.db") -> None:
         self.db_path = db_path
         self.conn: Optional[aiosqlite.Connection] = None
+        self._message_buffer: List[Tuple[Any, ...]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional["asyncio.Task[None]"] = None
 
     async def connect(self) -> None:
         """Open a SQLite connection and ensure schema exists."""
@@ -24,80 +92,169 @@ class SQLiteClient:
 
         os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         self.conn = await aiosqlite.connect(self.db_path)
+        # Rows come back as plain tuples; callers index positionally.
+        self.conn.row_factory = None
         await self.conn.execute("PRAGMA journal_mode=WAL;")
+        # WAL + synchronous=NORMAL only fsyncs at checkpoints; a power loss can drop the most
+        # recent commits but never corrupts the database.
+        await self.conn.execute("PRAGMA synchronous=NORMAL;")
+        await self.conn.execute("PRAGMA temp_store=MEMORY;")
+        await self.conn.execute("PRAGMA cache_size=-65536;")  # 64 MiB page cache
+        await self.conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB memory-mapped reads
+        await self.conn.execute("PRAGMA wal_autocheckpoint=10000;")
         await self._initialize_schema()
 
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = asyncio.create_task(self._periodic_flush())
+
     async def _initialize_schema(self) -> None:
         """Create required tables if they don't exist."""
         assert self.conn is not None
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS conversations (
-                session_id TEXT PRIMARY KEY,
-                status TEXT,
-                issue_type TEXT,
-                sentiment TEXT,
-                created_at TEXT,
-                updated_at TEXT
-            )
-            """
-        )
-
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT,
-                message_id TEXT,
-                customer_email TEXT,
-                message_type TEXT,
-                content TEXT,
-                metadata TEXT,
-                created_at TEXT
-            )
-            """
-        )
-
+        await self.conn.execute(_CREATE_CONVERSATIONS_SQL)
+        await self.conn.execute(_CREATE_MESSAGES_SQL)
+        for statement in _CREATE_INDEXES_SQL:
+            await self.conn.execute(statement)
         await self.conn.commit()
 
     async def close(self) -> None:
-        """Close the SQLite connection."""
+        """Flush buffered messages and close the SQLite connection."""
+        if self._flush_task:
+            # Cancel only while holding the lock, so an in-progress background flush commits first.
+            assert self._flush_lock is not None
+            async with self._flush_lock:
+                self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
         if self.conn:
-            await self.conn.close()
-            self.conn = None
+            try:
+                await self.flush()
+            finally:
+                await self.conn.close()
+                self.conn = None
+
+    async def flush(self) -> None:
+        """Write buffered messages with one executemany and a single commit."""
+        if not self._message_buffer or self.conn is None or self._flush_lock is None:
+            return
+
+        async with self._flush_lock:
+            rows, self._message_buffer = self._message_buffer, []
+            if not rows:
+                return
+            # One timestamp per batch; rows keep their arrival order through the autoincrement id.
+            created_at = datetime.datetime.utcnow().isoformat()
+            stamped = [row + (created_at,) for row in rows]
+            try:
+                try:
+                    await self.conn.executemany(_INSERT_MESSAGE_SQL, stamped)
+                except sqlite3.OperationalError:
+                    raise
+                except Exception:
+                    # A row SQLite rejects would fail every retry and block the flush that
+                    # queries run first, so write the batch row by row and drop the rejects.
+                    await self.conn.rollback()
+                    await self._insert_each(stamped)
+                await self.conn.commit()
+            except BaseException:
+                # Lock/I/O errors can clear up, and a cancelled flush still owes its rows to
+                # the final flush in close(): undo the partial insert and requeue the batch.
+                self._requeue(rows)
+                await self.conn.rollback()
+                raise
+
+    async def _insert_each(self, rows: List[Tuple[Any, ...]]) -> None:
+        """Insert stamped message rows one at a time, logging and skipping any SQLite rejects."""
+        assert self.conn is not None
+        for row in rows:
+            try:
+                await self.conn.execute(_INSERT_MESSAGE_SQL, row)
+            except sqlite3.OperationalError:
+                raise
+            except Exception:
+                logger.exception("Dropped buffered message %s rejected by SQLite", row[1])
+
+    def _requeue(self, rows: List[Tuple[Any, ...]]) -> None:
+        """Put rows back ahead of anything buffered meanwhile, keeping at most MAX_BUFFERED_MESSAGES."""
+        self._message_buffer[:0] = rows
+        overflow = len(self._message_buffer) - self.MAX_BUFFERED_MESSAGES
+        if overflow > 0:
+            del self._message_buffer[:overflow]
+            logger.error("SQLite unavailable; dropped %d oldest buffered messages", overflow)
+
+    async def _periodic_flush(self) -> None:
+        """Flush the message buffer every FLUSH_INTERVAL seconds."""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered messages to SQLite")
 
     async def _ensure_connected(self) -> None:
         """Ensure a connection is available."""
         if self.conn is None:
             await self.connect()
 
-    # Generic helpers
+    # Generic helpers (flush buffered messages first so queries see every logged message)
     async def execute(self, query: str, params: Tuple[Any, ...] = ()) -> None:
         """Execute a write query."""
         await self._ensure_connected()
         assert self.conn is not None
+        await self.flush()
         await self.conn.execute(query, params)
         await self.conn.commit()
 
-    async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()) -> Optional[aiosqlite.Row]:
+    async def execute_many(self, query: str, rows: Iterable[Tuple[Any, ...]]) -> None:
+        """Execute a write query once per parameter tuple and commit once."""
+        await self._ensure_connected()
+        assert self.conn is not None
+        await self.flush()
+        await self.conn.executemany(query, rows)
+        await self.conn.commit()
+
+    async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()) -> Optional[Tuple[Any, ...]]:
         """Fetch a single row."""
         await self._ensure_connected()
         assert self.conn is not None
+        await self.flush()
         cursor = await self.conn.execute(query, params)
         row = await cursor.fetchone()
         await cursor.close()
         return row
 
-    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()) -> List[aiosqlite.Row]:
+    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
         """Fetch all rows."""
         await self._ensure_connected()
         assert self.conn is not None
+        await self.flush()
         cursor = await self.conn.execute(query, params)
         rows = await cursor.fetchall()
         await cursor.close()
         return rows
 
+    async def iter_rows(
+        self, query: str, params: Tuple[Any, ...] = (), batch_size: int = 1000
+    ) -> AsyncIterator[Tuple[Any, ...]]:
+        """Yield rows in fetchmany batches so large reads use bounded memory."""
+        await self._ensure_connected()
+        assert self.conn is not None
+        await self.flush()
+        cursor = await self.conn.execute(query, params)
+        try:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await cursor.close()
+
     # Domain-specific helpers
     async def add_message(
         self,
@@ -108,21 +265,50 @@ class SQLiteClient:
         content: str,
         metadata: Optional[Dict[str, Any]] = None,
     ) -> None:
-        """Insert a conversation message."""
+        """
+        Queue a conversation message for insertion.
+
+        Messages are buffered and written in batches, either once FLUSH_BATCH_SIZE rows are
+        pending or by the background flush every FLUSH_INTERVAL seconds. created_at records
+        the flush time, so it can trail the call by up to FLUSH_INTERVAL.
+        """
         await self._ensure_connected()
-        assert self.conn is not None
 
-        created_at = datetime.datetime.utcnow().isoformat()
-        metadata_json = json.dumps(metadata or {})
+        # Stored as raw UTF-8 bytes (a BLOB) to skip a decode/encode round-trip. Non-str keys
+        # are stringified as json.dumps did, rather than raising TypeError.
+        metadata_blob = orjson.dumps(metadata or {}, option=orjson.OPT_NON_STR_KEYS)
 
-        await self.conn.execute(
-            """
-            INSERT INTO messages (session_id, message_id, customer_email, message_type, content, metadata, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (session_id, message_id, customer_email, message_type, content, metadata_json, created_at),
-        )
-        await self.conn.commit()
+        row = (session_id, message_id, customer_email, message_type, content, metadata_blob)
+        # Binding happens at flush time, so reject what sqlite3 can't bind while the caller can still see it.
+        for position, value in enumerate(row, 1):
+            if not isinstance(value, _BINDABLE_TYPES):
+                raise sqlite3.ProgrammingError(
+                    f"Error binding parameter {position}: type '{type(value).__name__}' is not supported"
+                )
+
+        self._message_buffer.append(row)
+        if len(self._message_buffer) >= self.FLUSH_BATCH_SIZE:
+            await self.flush()
+
+    async def get_messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return a session's messages in chronological order with decoded metadata."""
+        messages: List[Dict[str, Any]] = []
+        async for message_id, customer_email, message_type, content, metadata, created_at in self.iter_rows(
+            _SELECT_SESSION_MESSAGES_SQL, (session_id,)
+        ):
+            messages.append(
+                {
+                    "session_id": session_id,
+                    "message_id": message_id,
+                    "customer_email": customer_email,
+                    "message_type": message_type,
+                    "content": content,
+                    # orjson accepts both BLOB rows and TEXT rows written before the switch
+                    "metadata": orjson.loads(metadata) if metadata else {},
+                    "created_at": created_at,
+                }
+            )
+        return messages
 
     async def update_conversation(
         self,
@@ -137,18 +323,7 @@ class SQLiteClient:
 
         now = datetime.datetime.utcnow().isoformat()
 
-        await self.conn.execute(
-            """
-            INSERT INTO conversations (session_id, status, issue_type, sentiment, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(session_id) DO UPDATE SET
-                status=excluded.status,
-                issue_type=excluded.issue_type,
-                sentiment=excluded.sentiment,
-                updated_at=excluded.updated_at
-            """,
-            (session_id, status, issue_type, sentiment, now, now),
-        )
+        await self.conn.execute(_UPSERT_CONVERSATION_SQL, (session_id, status, issue_type, sentiment, now, now))
         await self.conn.commit()
 
     async def health_check(self) -> Dict[str, Any]:
@@ -182,3 +357,12 @@ async def init_sqlite(db_path: str = "data/conversations.db") -> SQLiteClient:
     await sqlite_client.connect()
     return sqlite_client
 
+
+async def flush_sqlite() -> None:
+    """Persist messages still buffered in the shared SQLite client, if it is connected."""
+    await sqlite_client.flush()
+
+
+async def close_sqlite() -> None:
+    """Flush and close the shared SQLite client."""
+    await sqlite_client.close()
@@ -138,7 +138,7 @@ class TestSystemEndToEnd:
 
         with (
             patch("nats.connect", return_value=mock_nc),
-            patch("redis.asyncio.from_url", return_value=mock_redis),
+            patch("redis.asyncio.Redis.from_pool", return_value=mock_redis),
             patch("httpx.AsyncClient") as mock_client_class,
         ):
             mock_client_class.return_value.__aenter__.return_value = mock_http_client
@@ -6,10 +6,35 @@ context caching, database operations, and error handling scenarios.
 """
 
 import json
+import sqlite3
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import msgpack
+import orjson
 import pytest
-from storage.redis_client import RedisClient, SessionState, get_redis_client, init_redis
+import pytest_asyncio
+import zstandard
+from storage.redis_client import CONTEXT_COMPRESS_THRESHOLD, RedisClient, SessionState, get_redis_client, init_redis
+from storage.sqlite_client import SQLiteClient, flush_sqlite
+
+
+def _mock_pipeline(results):
+    """Build a mock Redis pipeline whose execute() returns the given results."""
+    pipe = MagicMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.execute = AsyncMock(return_value=results)
+    return pipe
+
+
+def _mock_transaction(pipe):
+    """Build a stand-in for Redis.transaction() that runs the callable against the given pipe."""
+
+    async def transaction(func, *watches, value_from_callable=False):
+        value = await func(pipe)
+        return value if value_from_callable else await pipe.execute()
+
+    return AsyncMock(side_effect=transaction)
 
 
 class TestSessionState:
@@ -84,7 +109,6 @@ class TestRedisClient:
         """Create a mock Redis connection."""
         mock_redis = AsyncMock()
         mock_redis.ping = AsyncMock(return_value=True)
-        mock_redis.setex = AsyncMock(return_value=True)
         mock_redis.get = AsyncMock(return_value=None)
         mock_redis.delete = AsyncMock(return_value=1)
         mock_redis.incrby = AsyncMock(return_value=1)
@@ -97,7 +121,6 @@ class TestRedisClient:
                 "uptime_in_seconds": 3600,
             }
         )
-        mock_redis.scan_iter = AsyncMock(return_value=AsyncMock(__aiter__=lambda x: iter([])))
         return mock_redis
 
     def test_redis_client_initialization(self, redis_client):
@@ -111,25 +134,46 @@ class TestRedisClient:
         assert redis_client.CONTEXT_PREFIX == "context:"
         assert redis_client.TEMP_PREFIX == "temp:"
         assert redis_client.COUNTER_PREFIX == "counter:"
+        assert redis_client.CUSTOMER_SESSIONS_PREFIX == "customer_sessions:"
+        assert redis_client.SESSION_STATS_PREFIX == "session_stats:"
 
         # Check TTL values
         assert redis_client.SESSION_TTL == 3600 * 24
         assert redis_client.CONTEXT_TTL == 3600 * 2
         assert redis_client.TEMP_TTL == 300
 
+    def test_redis_client_url_from_env(self, monkeypatch):
+        """Test the Redis URL falls back to REDIS_URL, including unix socket URLs."""
+        monkeypatch.setenv("REDIS_URL", "unix:///var/run/redis/redis.sock")
+
+        assert RedisClient().redis_url == "unix:///var/run/redis/redis.sock"
+        assert RedisClient("redis://explicit:6379").redis_url == "redis://explicit:6379"
+
+        monkeypatch.delenv("REDIS_URL")
+        assert RedisClient().redis_url == "redis://localhost:6379"
+
     @pytest.mark.asyncio
     async def test_connect_success(self, redis_client, mock_redis):
         """Test successful Redis connection."""
-        with patch("redis.asyncio.from_url", return_value=mock_redis):
+        with patch("redis.asyncio.BlockingConnectionPool.from_url") as mock_pool_from_url, patch(
+            "redis.asyncio.Redis.from_pool", return_value=mock_redis
+        ) as mock_from_pool:
             await redis_client.connect()
 
+            # One decoding pool for text keys, one raw pool for MessagePack context blobs
+            assert [c.kwargs["decode_responses"] for c in mock_pool_from_url.call_args_list] == [True, False]
+            mock_pool_from_url.assert_called_with(
+                "redis://localhost:6379", db=1, decode_responses=False, max_connections=64, timeout=5
+            )
+            assert mock_from_pool.call_count == 2
             assert redis_client.redis == mock_redis
+            assert redis_client.binary_redis == mock_redis
             mock_redis.ping.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_connect_failure(self, redis_client):
         """Test Redis connection failure."""
-        with patch("redis.asyncio.from_url", side_effect=Exception("Connection failed")):
+        with patch("redis.asyncio.BlockingConnectionPool.from_url", side_effect=Exception("Connection failed")):
             with pytest.raises(Exception, match="Connection failed"):
                 await redis_client.connect()
 
@@ -145,7 +189,7 @@ class TestRedisClient:
     @pytest.mark.asyncio
     async def test_ensure_connected(self, redis_client, mock_redis):
         """Test automatic connection when needed."""
-        with patch("redis.asyncio.from_url", return_value=mock_redis):
+        with patch("redis.asyncio.Redis.from_pool", return_value=mock_redis):
             await redis_client._ensure_connected()
 
             assert redis_client.redis == mock_redis
@@ -154,6 +198,8 @@ class TestRedisClient:
     async def test_create_session(self, redis_client, mock_redis):
         """Test session creation."""
         redis_client.redis = mock_redis
+        pipe = _mock_pipeline([True, 2, True, 1, True])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
 
         with patch("storage.redis_client.datetime") as mock_datetime:
             mock_datetime.now.return_value.isoformat.return_value = "2024-01-15T10:30:00"
@@ -165,11 +211,28 @@ class TestRedisClient:
             assert session.created_at == "2024-01-15T10:30:00"
             assert session.last_activity == "2024-01-15T10:30:00"
 
-            # Verify Redis call
-            mock_redis.setex.assert_called_once()
-            call_args = mock_redis.setex.call_args[0]
-            assert call_args[0] == "session:test-session"
-            assert call_args[1] == redis_client.SESSION_TTL
+            # Session blob, stats hash and customer index are written in one pipeline
+            session_call, since_call = pipe.set.call_args_list
+            assert since_call.args[0] == "customer_sessions_since"
+            assert since_call.kwargs == {"nx": True}
+            call_args = session_call
+            assert call_args.args[0] == "session:test-session"
+            assert call_args.kwargs["ex"] == redis_client.SESSION_TTL
+            assert orjson.loads(call_args.args[1]) == session.model_dump()
+            pipe.hset.assert_called_once_with(
+                "session_stats:test-session",
+                mapping={
+                    "message_count": 0,
+                    "last_activity": "2024-01-15T10:30:00",
+                    "customer_email": "test@example.com",
+                },
+            )
+            pipe.sadd.assert_called_once_with("customer_sessions:test@example.com", "test-session")
+            assert [c.args for c in pipe.expire.call_args_list] == [
+                ("session_stats:test-session", redis_client.SESSION_TTL),
+                ("customer_sessions:test@example.com", redis_client.SESSION_TTL),
+            ]
+            pipe.execute.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_get_session_exists(self, redis_client, mock_redis):
@@ -183,7 +246,8 @@ class TestRedisClient:
             created_at="2024-01-15T10:30:00",
             last_activity="2024-01-15T10:30:00",
         )
-        mock_redis.get.return_value = session_data.model_dump_json()
+        pipe = _mock_pipeline([session_data.model_dump_json(), {}])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
 
         session = await redis_client.get_session("test-session")
 
@@ -191,101 +255,191 @@ class TestRedisClient:
         assert session.session_id == "test-session"
         assert session.customer_email == "test@example.com"
 
-        mock_redis.get.assert_called_once_with("session:test-session")
+        pipe.get.assert_called_once_with("session:test-session")
+        pipe.hgetall.assert_called_once_with("session_stats:test-session")
+
+    @pytest.mark.asyncio
+    async def test_get_session_overlays_stats(self, redis_client, mock_redis):
+        """Test live counters from the stats hash take precedence over the blob."""
+        redis_client.redis = mock_redis
+
+        session_data = SessionState(
+            session_id="test-session",
+            customer_email="test@example.com",
+            created_at="2024-01-15T10:30:00",
+            last_activity="2024-01-15T10:30:00",
+        )
+        stats = {"message_count": "7", "last_activity": "2024-01-15T11:00:00"}
+        mock_redis.pipeline = MagicMock(return_value=_mock_pipeline([session_data.model_dump_json(), stats]))
+
+        session = await redis_client.get_session("test-session")
+
+        assert session.message_count == 7
+        assert session.last_activity == "2024-01-15T11:00:00"
 
     @pytest.mark.asyncio
     async def test_get_session_not_exists(self, redis_client, mock_redis):
         """Test getting non-existent session."""
         redis_client.redis = mock_redis
-        mock_redis.get.return_value = None
+        mock_redis.pipeline = MagicMock(return_value=_mock_pipeline([None, {}]))
 
         session = await redis_client.get_session("nonexistent")
 
         assert session is None
-        mock_redis.get.assert_called_once_with("session:nonexistent")
+
+    @pytest.mark.asyncio
+    async def test_get_session_corrupted(self, redis_client, mock_redis):
+        """Test getting a session whose stored payload is not valid JSON."""
+        redis_client.redis = mock_redis
+        mock_redis.pipeline = MagicMock(return_value=_mock_pipeline(["not json", {"message_count": "1"}]))
+
+        session = await redis_client.get_session("test-session")
+
+        assert session is None
 
     @pytest.mark.asyncio
     async def test_update_session_success(self, redis_client, mock_redis):
         """Test successful session update."""
         redis_client.redis = mock_redis
+        stored = {
+            "session_id": "test-session",
+            "customer_email": "test@example.com",
+            "created_at": "2024-01-15T10:30:00",
+            "last_activity": "2024-01-15T10:30:00",
+            "context": {"tags": [], "order_total": 12345678901234567},
+            "message_count": 3,
+            "status": "active",
+        }
+        pipe = _mock_pipeline([True, 1, True])
+        pipe.get = AsyncMock(return_value=orjson.dumps(stored))
+        mock_redis.transaction = _mock_transaction(pipe)
 
-        # Mock existing session
-        existing_session = SessionState(
-            session_id="test-session",
-            customer_email="test@example.com",
-            created_at="2024-01-15T10:30:00",
-            last_activity="2024-01-15T10:30:00",
-            message_count=5,
-            status="active",
-        )
-        mock_redis.get.return_value = existing_session.model_dump_json()
-
-        with patch("datetime.datetime") as mock_datetime:
-            mock_datetime.utcnow.return_value.isoformat.return_value = "2024-01-15T11:00:00"
+        with patch("storage.redis_client.datetime") as mock_datetime:
+            mock_datetime.now.return_value.isoformat.return_value = "2024-01-15T11:00:00"
 
-            result = await redis_client.update_session("test-session", status="escalated", message_count=10)
+            result = await redis_client.update_session(
+                "test-session", status="escalated", message_count=10, sentiment=None, unknown="x"
+            )
 
-            assert result is True
-            mock_redis.setex.assert_called_once()
+        assert result is True
+        assert mock_redis.transaction.call_args.args[1:] == ("session:test-session",)
+        pipe.get.assert_awaited_once_with("session:test-session")
+        pipe.multi.assert_called_once()
+
+        # Only known, non-None fields are merged; everything else is written back verbatim
+        key, data = pipe.set.call_args.args
+        assert key == "session:test-session"
+        assert pipe.set.call_args.kwargs == {"ex": redis_client.SESSION_TTL}
+        assert orjson.loads(data) == {
+            **stored,
+            "status": "escalated",
+            "message_count": 10,
+            "last_activity": "2024-01-15T11:00:00",
+        }
+        pipe.hsetnx.assert_called_once_with("session_stats:test-session", "message_count", 10)
+        pipe.hset.assert_called_once_with(
+            "session_stats:test-session",
+            mapping={
+                "last_activity": "2024-01-15T11:00:00",
+                "message_count": 10,
+                "customer_email": "test@example.com",
+            },
+        )
+        assert [c.args for c in pipe.expire.call_args_list] == [
+            ("session_stats:test-session", redis_client.SESSION_TTL),
+            ("customer_sessions:test@example.com", redis_client.SESSION_TTL),
+        ]
 
     @pytest.mark.asyncio
     async def test_update_session_not_found(self, redis_client, mock_redis):
         """Test updating non-existent session."""
         redis_client.redis = mock_redis
-        mock_redis.get.return_value = None
+        pipe = _mock_pipeline([])
+        pipe.get = AsyncMock(return_value=None)
+        mock_redis.transaction = _mock_transaction(pipe)
 
         result = await redis_client.update_session("nonexistent", status="escalated")
 
         assert result is False
+        pipe.set.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_increment_message_count(self, redis_client, mock_redis):
         """Test incrementing message count."""
         redis_client.redis = mock_redis
+        increment_script = AsyncMock(return_value=[6, "test@example.com"])
+        mock_redis.register_script = MagicMock(return_value=increment_script)
+        mock_redis.expire = AsyncMock(return_value=True)
 
-        # Mock existing session
-        existing_session = SessionState(
-            session_id="test-session",
-            customer_email="test@example.com",
-            created_at="2024-01-15T10:30:00",
-            last_activity="2024-01-15T10:30:00",
-            message_count=5,
-        )
-        mock_redis.get.return_value = existing_session.model_dump_json()
-
-        with patch("datetime.datetime") as mock_datetime:
-            mock_datetime.utcnow.return_value.isoformat.return_value = "2024-01-15T11:00:00"
+        with patch("storage.redis_client.datetime") as mock_datetime:
+            mock_datetime.now.return_value.isoformat.return_value = "2024-01-15T11:00:00"
 
             count = await redis_client.increment_message_count("test-session")
 
             assert count == 6
-            mock_redis.setex.assert_called_once()
+            increment_script.assert_awaited_once_with(
+                keys=["session:test-session", "session_stats:test-session"],
+                args=["2024-01-15T11:00:00", redis_client.SESSION_TTL],
+            )
+            # The index key is only known once the script returns the email, so it's touched client-side.
+            mock_redis.expire.assert_awaited_once_with("customer_sessions:test@example.com", redis_client.SESSION_TTL)
 
     @pytest.mark.asyncio
     async def test_increment_message_count_no_session(self, redis_client, mock_redis):
         """Test incrementing message count for non-existent session."""
         redis_client.redis = mock_redis
-        mock_redis.get.return_value = None
+        mock_redis.register_script = MagicMock(return_value=AsyncMock(return_value=[0, ""]))
+        mock_redis.expire = AsyncMock()
 
         count = await redis_client.increment_message_count("nonexistent")
 
         assert count == 0
+        mock_redis.expire.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_scripts_registered_once(self, redis_client, mock_redis):
+        """Test Lua scripts are registered once per connection and reused."""
+        redis_client.redis = mock_redis
+        mock_redis.register_script = MagicMock(return_value=AsyncMock(return_value=[1, ""]))
+
+        await redis_client.increment_message_count("test-session")
+        await redis_client.increment_message_count("test-session")
+
+        mock_redis.register_script.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_delete_session(self, redis_client, mock_redis):
         """Test session deletion."""
         redis_client.redis = mock_redis
-        mock_redis.delete.return_value = 1
+        pipe = _mock_pipeline([1, 1, 1])
+        pipe.get = AsyncMock(return_value=orjson.dumps({"customer_email": "test@example.com"}))
+        mock_redis.transaction = _mock_transaction(pipe)
 
         result = await redis_client.delete_session("test-session")
 
         assert result is True
-        mock_redis.delete.assert_called_once_with("session:test-session")
+        assert mock_redis.transaction.call_args.args[1:] == ("session:test-session",)
+        assert [c.args[0] for c in pipe.delete.call_args_list] == ["session:test-session", "session_stats:test-session"]
+        pipe.srem.assert_called_once_with("customer_sessions:test@example.com", "test-session")
+
+    @pytest.mark.asyncio
+    async def test_delete_session_not_found(self, redis_client, mock_redis):
+        """Test deleting a non-existent session."""
+        redis_client.redis = mock_redis
+        pipe = _mock_pipeline([0, 0])
+        pipe.get = AsyncMock(return_value=None)
+        mock_redis.transaction = _mock_transaction(pipe)
+
+        result = await redis_client.delete_session("nonexistent")
+
+        assert result is False
+        pipe.srem.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_set_context(self, redis_client, mock_redis):
         """Test setting customer context."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
 
         context_data = {
             "customer_tier": "premium",
@@ -295,29 +449,87 @@ class TestRedisClient:
 
         await redis_client.set_context("test@example.com", context_data)
 
-        mock_redis.setex.assert_called_once()
-        call_args = mock_redis.setex.call_args[0]
-        assert call_args[0] == "context:test@example.com"
-        assert call_args[1] == redis_client.CONTEXT_TTL
-        assert json.loads(call_args[2]) == context_data
+        mock_redis.set.assert_called_once()
+        call_args = mock_redis.set.call_args
+        assert call_args.args[0] == "context:test@example.com"
+        assert call_args.kwargs["ex"] == redis_client.CONTEXT_TTL
+        assert msgpack.unpackb(call_args.args[1]) == context_data
 
     @pytest.mark.asyncio
     async def test_get_context_exists(self, redis_client, mock_redis):
         """Test getting existing context."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
 
         context_data = {"customer_tier": "premium"}
-        mock_redis.get.return_value = json.dumps(context_data)
+        mock_redis.get.return_value = msgpack.packb(context_data)
 
         result = await redis_client.get_context("test@example.com")
 
         assert result == context_data
         mock_redis.get.assert_called_once_with("context:test@example.com")
 
+    @pytest.mark.asyncio
+    async def test_context_large_payload_compressed(self, redis_client, mock_redis):
+        """Test large contexts are stored zstd-compressed behind a marker byte."""
+        redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
+
+        context_data = {"history": ["Where is my order ORD-12345?"] * 200}
+        packed = msgpack.packb(context_data, use_bin_type=True)
+        assert len(packed) > CONTEXT_COMPRESS_THRESHOLD
+
+        await redis_client.set_context("test@example.com", context_data)
+
+        stored = mock_redis.set.call_args.args[1]
+        assert stored[:1] == b"\x01"
+        assert len(stored) < len(packed)
+        assert zstandard.ZstdDecompressor().decompress(stored[1:]) == packed
+
+        mock_redis.get.return_value = stored
+        assert await redis_client.get_context("test@example.com") == context_data
+
+    @pytest.mark.asyncio
+    async def test_context_non_str_keys_roundtrip(self, redis_client, mock_redis):
+        """Test contexts with non-str keys read back intact instead of being dropped as corrupt."""
+        redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
+        context_data = {1: "x", "orders": {2024: ["ORD-1"]}}
+
+        await redis_client.set_context("test@example.com", context_data)
+        mock_redis.get.return_value = mock_redis.set.call_args.args[1]
+
+        assert await redis_client.get_context("test@example.com") == context_data
+        mock_redis.delete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_context_legacy_json(self, redis_client, mock_redis):
+        """Test a context cached as JSON before the MessagePack switch is dropped as a miss."""
+        redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
+        mock_redis.get.return_value = b'{"customer_tier": "premium"}'
+
+        result = await redis_client.get_context("test@example.com")
+
+        assert result is None
+        mock_redis.delete.assert_awaited_once_with("context:test@example.com")
+
+    @pytest.mark.asyncio
+    async def test_update_context_replaces_legacy_json(self, redis_client, mock_redis):
+        """Test updating over an undecodable context starts from an empty one."""
+        redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
+        mock_redis.get.return_value = b'{"customer_tier": "premium"}'
+
+        await redis_client.update_context("test@example.com", {"last_order": "ORD-12345"})
+
+        assert msgpack.unpackb(mock_redis.set.call_args.args[1]) == {"last_order": "ORD-12345"}
+
     @pytest.mark.asyncio
     async def test_get_context_not_exists(self, redis_client, mock_redis):
         """Test getting non-existent context."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
         mock_redis.get.return_value = None
 
         result = await redis_client.get_context("test@example.com")
@@ -328,24 +540,26 @@ class TestRedisClient:
     async def test_update_context(self, redis_client, mock_redis):
         """Test updating customer context."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
 
         existing_context = {"customer_tier": "standard"}
         updates = {"last_order": "ORD-12345", "customer_tier": "premium"}
         expected_result = {"customer_tier": "premium", "last_order": "ORD-12345"}
 
-        mock_redis.get.return_value = json.dumps(existing_context)
+        mock_redis.get.return_value = msgpack.packb(existing_context)
 
         await redis_client.update_context("test@example.com", updates)
 
-        # Should have called setex with merged data
-        mock_redis.setex.assert_called_once()
-        call_args = mock_redis.setex.call_args[0]
-        assert json.loads(call_args[2]) == expected_result
+        # Should have called set with merged data
+        mock_redis.set.assert_called_once()
+        call_args = mock_redis.set.call_args
+        assert msgpack.unpackb(call_args.args[1]) == expected_result
 
     @pytest.mark.asyncio
     async def test_update_context_no_existing(self, redis_client, mock_redis):
         """Test updating context when no existing context."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
         mock_redis.get.return_value = None
 
         updates = {"customer_tier": "premium"}
@@ -353,14 +567,15 @@ class TestRedisClient:
         await redis_client.update_context("test@example.com", updates)
 
         # Should create new context with updates
-        mock_redis.setex.assert_called_once()
-        call_args = mock_redis.setex.call_args[0]
-        assert json.loads(call_args[2]) == updates
+        mock_redis.set.assert_called_once()
+        call_args = mock_redis.set.call_args
+        assert msgpack.unpackb(call_args.args[1]) == updates
 
     @pytest.mark.asyncio
     async def test_delete_context(self, redis_client, mock_redis):
         """Test context deletion."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
         mock_redis.delete.return_value = 1
 
         result = await redis_client.delete_context("test@example.com")
@@ -377,11 +592,20 @@ class TestRedisClient:
 
         await redis_client.set_temp_data("test-key", temp_data, ttl=600)
 
-        mock_redis.setex.assert_called_once()
-        call_args = mock_redis.setex.call_args[0]
-        assert call_args[0] == "temp:test-key"
-        assert call_args[1] == 600
-        assert json.loads(call_args[2]) == temp_data
+        mock_redis.set.assert_called_once()
+        call_args = mock_redis.set.call_args
+        assert call_args.args[0] == "temp:test-key"
+        assert call_args.kwargs["ex"] == 600
+        assert json.loads(call_args.args[1]) == temp_data
+
+    @pytest.mark.asyncio
+    async def test_set_temp_data_non_str_keys(self, redis_client, mock_redis):
+        """Test non-str dict keys are stringified rather than rejected."""
+        redis_client.redis = mock_redis
+
+        await redis_client.set_temp_data("test-key", {1: "one", "two": 2})
+
+        assert json.loads(mock_redis.set.call_args.args[1]) == {"1": "one", "two": 2}
 
     @pytest.mark.asyncio
     async def test_set_temp_data_string(self, redis_client, mock_redis):
@@ -390,11 +614,11 @@ class TestRedisClient:
 
         await redis_client.set_temp_data("test-key", "test-value")
 
-        mock_redis.setex.assert_called_once()
-        call_args = mock_redis.setex.call_args[0]
-        assert call_args[0] == "temp:test-key"
-        assert call_args[1] == redis_client.TEMP_TTL
-        assert call_args[2] == "test-value"
+        mock_redis.set.assert_called_once()
+        call_args = mock_redis.set.call_args
+        assert call_args.args[0] == "temp:test-key"
+        assert call_args.kwargs["ex"] == redis_client.TEMP_TTL
+        assert call_args.args[1] == "test-value"
 
     @pytest.mark.asyncio
     async def test_get_temp_data(self, redis_client, mock_redis):
@@ -495,45 +719,58 @@ class TestRedisClient:
             last_activity="2024-01-15T12:00:00",
         )
 
-        # Mock scan_iter and get calls
-        keys = ["session:session-1", "session:session-2", "session:session-3"]
-        values = [session1.model_dump_json(), session2.model_dump_json(), session3.model_dump_json()]
+        # Mock customer index lookup and batched mget
+        session_ids = ["session-1", "session-2", "session-3", "expired"]
+        values = [session1.model_dump_json(), session2.model_dump_json(), session3.model_dump_json(), None]
 
-        async def mock_scan_iter(pattern):
-            for key in keys:
-                yield key
-
-        async def mock_get(key):
-            index = keys.index(key)
-            return values[index]
-
-        mock_redis.scan_iter = mock_scan_iter
-        mock_redis.get.side_effect = mock_get
+        mock_redis.smembers = AsyncMock(return_value=session_ids)
+        pipe = _mock_pipeline([values, {}, {}, {"message_count": "4"}, {}])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+        mock_redis.srem = AsyncMock(return_value=1)
 
         sessions = await redis_client.get_sessions_by_customer("test@example.com")
 
+        # session-2 belongs to another customer and is filtered out
         assert len(sessions) == 2
         assert all(s.customer_email == "test@example.com" for s in sessions)
         assert {s.session_id for s in sessions} == {"session-1", "session-3"}
+        assert {s.session_id: s.message_count for s in sessions} == {"session-1": 0, "session-3": 4}
+        mock_redis.smembers.assert_awaited_once_with("customer_sessions:test@example.com")
+
+        # Blobs and stats hashes arrive in a single pipelined round-trip
+        pipe.mget.assert_called_once_with([f"session:{session_id}" for session_id in session_ids])
+        assert [c.args[0] for c in pipe.hgetall.call_args_list] == [
+            f"session_stats:{session_id}" for session_id in session_ids
+        ]
+        mock_redis.get.assert_not_called()
+
+        # Expired sessions are pruned from the index
+        mock_redis.srem.assert_awaited_once_with("customer_sessions:test@example.com", "expired")
+
+    @pytest.mark.asyncio
+    async def test_get_sessions_by_customer_no_index(self, redis_client, mock_redis):
+        """Test customers without indexed sessions skip the MGET once every session is indexed."""
+        redis_client.redis = mock_redis
+        mock_redis.smembers = AsyncMock(return_value=set())
+        mock_redis.get = AsyncMock(return_value=str(time.time() - redis_client.SESSION_TTL - 60))
+        mock_redis.scan_iter = MagicMock()
+        mock_redis.pipeline = MagicMock()
+
+        sessions = await redis_client.get_sessions_by_customer("nobody@example.com")
+
+        assert sessions == []
+        mock_redis.get.assert_awaited_once_with("customer_sessions_since")
+        mock_redis.scan_iter.assert_not_called()
+        mock_redis.pipeline.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_cleanup_expired_data(self, redis_client, mock_redis):
         """Test cleanup expired data stats."""
         redis_client.redis = mock_redis
 
-        # Mock different key counts
-        async def mock_scan_iter(pattern):
-            if "session:" in pattern:
-                for i in range(3):
-                    yield f"session:test-{i}"
-            elif "context:" in pattern:
-                for i in range(2):
-                    yield f"context:test-{i}"
-            elif "temp:" in pattern:
-                for i in range(1):
-                    yield f"temp:test-{i}"
-
-        mock_redis.scan_iter = mock_scan_iter
+        # Each script call counts one SCAN page and hands back the next cursor
+        count_script = AsyncMock(side_effect=[["17", [2, 0, 1]], ["0", [1, 2, 0]]])
+        mock_redis.register_script = MagicMock(return_value=count_script)
 
         stats = await redis_client.cleanup_expired_data()
 
@@ -541,11 +778,17 @@ class TestRedisClient:
         assert stats["contexts_active"] == 2
         assert stats["temp_data_active"] == 1
 
+        assert [c.kwargs["args"] for c in count_script.call_args_list] == [
+            ["0", "session:", "context:", "temp:"],
+            ["17", "session:", "context:", "temp:"],
+        ]
+
     @pytest.mark.asyncio
     async def test_health_check_healthy(self, redis_client, mock_redis):
         """Test health check when Redis is healthy."""
         redis_client.redis = mock_redis
-        mock_redis.get.return_value = "ok"
+        pipe = _mock_pipeline([True, "ok", 1, await mock_redis.info()])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
 
         health = await redis_client.health_check()
 
@@ -555,14 +798,16 @@ class TestRedisClient:
         assert health["used_memory"] == "1.5M"
         assert health["uptime"] == 3600
 
-        # Verify test operations
-        mock_redis.set.assert_called_once()
-        mock_redis.delete.assert_called_once()
+        # Verify test operations were batched into one non-transactional pipeline
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        pipe.set.assert_called_once()
+        pipe.delete.assert_called_once()
+        pipe.execute.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_health_check_unhealthy(self, redis_client):
         """Test health check when Redis is unhealthy."""
-        with patch("redis.asyncio.from_url", side_effect=Exception("Connection failed")):
+        with patch("redis.asyncio.BlockingConnectionPool.from_url", side_effect=Exception("Connection failed")):
             health = await redis_client.health_check()
 
             assert health["status"] == "unhealthy"
@@ -623,7 +868,6 @@ class TestRedisClientIntegration:
         """Create a mock Redis connection."""
         mock_redis = AsyncMock()
         mock_redis.ping = AsyncMock(return_value=True)
-        mock_redis.setex = AsyncMock(return_value=True)
         mock_redis.get = AsyncMock(return_value=None)
         mock_redis.delete = AsyncMock(return_value=1)
         mock_redis.incrby = AsyncMock(return_value=1)
@@ -636,7 +880,6 @@ class TestRedisClientIntegration:
                 "connected_clients": 1,
             }
         )
-        mock_redis.scan_iter = AsyncMock(return_value=AsyncMock(__aiter__=lambda x: iter([])))
         return mock_redis
 
     @pytest.mark.asyncio
@@ -647,20 +890,17 @@ class TestRedisClientIntegration:
         # Mock different responses for different calls
         session_data = None
 
-        async def mock_get(key):
-            nonlocal session_data
-            if session_data and key == "session:test-session":
-                return session_data
-            return None
-
-        def mock_setex(key, ttl, data):
+        def mock_set(key, data, ex=None, nx=False):
             nonlocal session_data
             if key == "session:test-session":
                 session_data = data
             return True
 
-        mock_redis.get.side_effect = mock_get
-        mock_redis.setex.side_effect = mock_setex
+        create_pipe = _mock_pipeline([True, 2, True, 1, True])
+        create_pipe.set.side_effect = mock_set
+        get_pipe = _mock_pipeline(None)
+        get_pipe.execute.side_effect = lambda: [session_data, {}]
+        mock_redis.pipeline = MagicMock(side_effect=[create_pipe, get_pipe])
 
         with patch("storage.redis_client.datetime") as mock_datetime:
             mock_datetime.now.return_value.isoformat.return_value = "2024-01-15T10:30:00"
@@ -674,12 +914,18 @@ class TestRedisClientIntegration:
             assert retrieved is not None
             assert retrieved.session_id == "test-session"
 
-            # Update session
+            # Update session merges client-side in a transaction
+            update_pipe = _mock_pipeline([True, 1, True])
+            update_pipe.get = AsyncMock(side_effect=lambda key: session_data)
+            mock_redis.transaction = _mock_transaction(update_pipe)
+
+            # Increment message count runs as a server-side script
+            mock_redis.register_script = MagicMock(return_value=AsyncMock(return_value=[1, "test@example.com"]))
+
             mock_datetime.now.return_value.isoformat.return_value = "2024-01-15T11:00:00"
             result = await redis_client.update_session("test-session", status="escalated")
             assert result is True
 
-            # Increment message count
             count = await redis_client.increment_message_count("test-session")
             assert count == 1
 
@@ -687,23 +933,24 @@ class TestRedisClientIntegration:
     async def test_context_operations(self, redis_client, mock_redis):
         """Test context operations workflow."""
         redis_client.redis = mock_redis
+        redis_client.binary_redis = mock_redis
 
         context_data = None
 
         async def mock_get(key):
             nonlocal context_data
             if context_data and key == "context:test@example.com":
-                return json.dumps(context_data)
+                return msgpack.packb(context_data)
             return None
 
-        def mock_setex(key, ttl, data):
+        def mock_set(key, data, ex=None):
             nonlocal context_data
             if key == "context:test@example.com":
-                context_data = json.loads(data)
+                context_data = msgpack.unpackb(data)
             return True
 
         mock_redis.get.side_effect = mock_get
-        mock_redis.setex.side_effect = mock_setex
+        mock_redis.set.side_effect = mock_set
 
         # Set initial context
         initial_context = {"customer_tier": "standard"}
@@ -728,7 +975,7 @@ class TestRedisClientIntegration:
         # Test connection failure during operation
         redis_client.redis = None
 
-        with patch("redis.asyncio.from_url", side_effect=Exception("Connection failed")):
+        with patch("redis.asyncio.BlockingConnectionPool.from_url", side_effect=Exception("Connection failed")):
             with pytest.raises(Exception):
                 await redis_client.get_session("test")
 
@@ -774,14 +1021,14 @@ class TestRedisClientIntegration:
 
         stored_data = {}
 
-        def mock_setex(key, ttl, data):
+        def mock_set(key, data, ex=None):
             stored_data[key] = data
             return True
 
         async def mock_get(key):
             return stored_data.get(key)
 
-        mock_redis.setex.side_effect = mock_setex
+        mock_redis.set.side_effect = mock_set
         mock_redis.get.side_effect = mock_get
 
         # Test storing and retrieving different data types
@@ -791,7 +1038,447 @@ class TestRedisClientIntegration:
 
             if isinstance(data, (dict, list)):
                 # Should be JSON serialized
-                assert retrieved == json.dumps(data)
+                assert retrieved == orjson.dumps(data)
             else:
                 # Should be string
                 assert retrieved == str(data)
+
+
+class TestRedisClientLua:
+    """Test cases running RedisClient's Lua scripts on fakeredis's embedded Lua engine."""
+
+    @pytest_asyncio.fixture
+    async def redis_client(self):
+        """Create a RedisClient whose text and binary handles share one fake server."""
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+
+        server = fakeredis.FakeServer()
+        client = RedisClient()
+        client.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        client.binary_redis = fakeredis.FakeAsyncRedis(server=server)
+        yield client
+        await client.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_data_counts_every_page(self, redis_client):
+        """Test key counts add up across SCAN pages and ignore other prefixes."""
+        for i in range(1500):
+            await redis_client.create_session(f"session-{i}", f"customer-{i % 3}@example.com")
+        await redis_client.set_context("test@example.com", {"tier": "gold"})
+        await redis_client.set_temp_data("pending", "1")
+
+        stats = await redis_client.cleanup_expired_data()
+
+        assert stats == {"sessions_active": 1500, "contexts_active": 1, "temp_data_active": 1}
+
+    @pytest.mark.asyncio
+    async def test_update_session_preserves_context(self, redis_client):
+        """Test updating a session leaves context values it did not touch byte-for-byte intact."""
+        context = {"tags": [], "order_total": 12345678901234567, "ratio": 0.1 + 0.2, "nested": {"items": []}}
+        await redis_client.create_session("test-session", "test@example.com", context=context)
+
+        assert await redis_client.update_session("test-session", status="escalated") is True
+        await redis_client.increment_message_count("test-session")
+
+        session = await redis_client.get_session("test-session")
+        assert session.status == "escalated"
+        assert session.message_count == 1
+        assert session.context == context
+        assert orjson.loads(await redis_client.redis.get("session:test-session"))["context"] == context
+
+    @pytest.mark.asyncio
+    async def test_active_session_keeps_customer_index_alive(self, redis_client):
+        """Test updates and message counts refresh the customer index TTL along with the session."""
+        await redis_client.create_session("test-session", "test@example.com")
+        index_key = "customer_sessions:test@example.com"
+
+        # As if the customer's last create_session was almost a full SESSION_TTL ago.
+        await redis_client.redis.expire(index_key, 5)
+        await redis_client.update_session("test-session", status="escalated")
+        assert await redis_client.redis.ttl(index_key) > 5
+
+        await redis_client.redis.expire(index_key, 5)
+        await redis_client.increment_message_count("test-session")
+        assert await redis_client.redis.ttl(index_key) > 5
+
+        sessions = await redis_client.get_sessions_by_customer("test@example.com")
+        assert [session.session_id for session in sessions] == ["test-session"]
+
+    @pytest.mark.asyncio
+    async def test_increment_refreshes_index_for_legacy_stats(self, redis_client):
+        """Test a stats hash written without customer_email learns it from the blob."""
+        await redis_client.create_session("test-session", "test@example.com")
+        await redis_client.redis.hdel("session_stats:test-session", "customer_email")
+        await redis_client.redis.expire("customer_sessions:test@example.com", 5)
+
+        assert await redis_client.increment_message_count("test-session") == 1
+
+        assert await redis_client.redis.ttl("customer_sessions:test@example.com") > 5
+        assert await redis_client.redis.hget("session_stats:test-session", "customer_email") == "test@example.com"
+
+    @pytest.mark.asyncio
+    async def test_update_then_increment_legacy_session(self, redis_client):
+        """Test a session stored before stats hashes existed keeps its count across update + increment."""
+        legacy = {
+            "session_id": "legacy-session",
+            "customer_email": "test@example.com",
+            "created_at": "2024-01-15T10:30:00",
+            "last_activity": "2024-01-15T10:30:00",
+            "context": {},
+            "message_count": 5,
+            "status": "active",
+        }
+        await redis_client.redis.set("session:legacy-session", orjson.dumps(legacy), ex=redis_client.SESSION_TTL)
+
+        assert await redis_client.update_session("legacy-session", status="escalated") is True
+        assert (await redis_client.get_session("legacy-session")).message_count == 5
+
+        assert await redis_client.increment_message_count("legacy-session") == 6
+
+    @pytest.mark.asyncio
+    async def test_increment_seeds_partial_stats_hash(self, redis_client):
+        """Test a stats hash holding only last_activity still gets its count seeded from the blob."""
+        await redis_client.create_session("test-session", "test@example.com")
+        await redis_client.update_session("test-session", message_count=4)
+        await redis_client.redis.hdel("session_stats:test-session", "message_count")
+
+        assert await redis_client.increment_message_count("test-session") == 5
+
+    @pytest.mark.asyncio
+    async def test_delete_session_removes_index_entry(self, redis_client):
+        """Test deleting a session drops its blob, stats hash and customer index entry."""
+        await redis_client.create_session("session-1", "test@example.com")
+        await redis_client.create_session("session-2", "test@example.com")
+
+        assert await redis_client.delete_session("session-1") is True
+        assert await redis_client.delete_session("session-1") is False
+
+        assert await redis_client.redis.exists("session:session-1", "session_stats:session-1") == 0
+        assert await redis_client.redis.smembers("customer_sessions:test@example.com") == {"session-2"}
+
+    @pytest.mark.asyncio
+    async def test_get_sessions_by_customer_finds_unindexed_sessions(self, redis_client):
+        """Test sessions created before the customer index existed are found and indexed."""
+        legacy = SessionState(
+            session_id="legacy-session",
+            customer_email="legacy@example.com",
+            created_at="2024-01-15T10:30:00",
+            last_activity="2024-01-15T10:30:00",
+        )
+        await redis_client.redis.set("session:legacy-session", legacy.model_dump_json(), ex=redis_client.SESSION_TTL)
+        await redis_client.create_session("new-session", "other@example.com")
+
+        sessions = await redis_client.get_sessions_by_customer("legacy@example.com")
+
+        assert [session.session_id for session in sessions] == ["legacy-session"]
+        assert await redis_client.redis.smembers("customer_sessions:legacy@example.com") == {"legacy-session"}
+        assert await redis_client.redis.ttl("customer_sessions:legacy@example.com") > 0
+
+        # Once every pre-index session must have expired, a missing index means no sessions.
+        await redis_client.redis.set("customer_sessions_since", int(time.time()) - redis_client.SESSION_TTL - 60)
+        await redis_client.redis.delete("customer_sessions:legacy@example.com")
+        assert await redis_client.get_sessions_by_customer("legacy@example.com") == []
+
+    @pytest.mark.asyncio
+    async def test_update_session_missing(self, redis_client):
+        """Test updating a session that does not exist writes nothing."""
+        assert await redis_client.update_session("nonexistent", status="escalated") is False
+        assert await redis_client.redis.exists("session:nonexistent", "session_stats:nonexistent") == 0
+
+
+class TestSQLiteClient:
+    """Test cases for SQLiteClient against a temporary database."""
+
+    @pytest_asyncio.fixture
+    async def sqlite_client(self, tmp_path):
+        """Create a connected SQLiteClient with background flushing effectively disabled."""
+        client = SQLiteClient(db_path=str(tmp_path / "conversations.db"))
+        client.FLUSH_INTERVAL = 3600
+        await client.connect()
+        yield client
+        await client.close()
+
+    async def _count_committed(self, client):
+        """Count message rows without triggering a buffer flush."""
+        cursor = await client.conn.execute("SELECT COUNT(*) FROM messages")
+        (count,) = await cursor.fetchone()
+        await cursor.close()
+        return count
+
+    @pytest.mark.asyncio
+    async def test_schema_indexes(self, sqlite_client):
+        """Test session and recency lookups are served by indexes."""
+        rows = await sqlite_client.fetch_all(
+            "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE session_id = ? ORDER BY created_at", ("session-1",)
+        )
+        assert any("idx_messages_session" in row[-1] for row in rows)
+
+        rows = await sqlite_client.fetch_all("EXPLAIN QUERY PLAN SELECT * FROM conversations ORDER BY updated_at DESC")
+        assert any("idx_conversations_updated" in row[-1] for row in rows)
+
+    @pytest.mark.asyncio
+    async def test_connection_pragmas(self, sqlite_client):
+        """Test the connection is opened with the WAL and cache tuning PRAGMAs."""
+        expected = {
+            "journal_mode": "wal",
+            "synchronous": 1,  # NORMAL
+            "temp_store": 2,  # MEMORY
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "wal_autocheckpoint": 10000,
+        }
+
+        for pragma, value in expected.items():
+            row = await sqlite_client.fetch_one(f"PRAGMA {pragma}")
+            assert row[0] == value, pragma
+
+    @pytest.mark.asyncio
+    async def test_add_message_is_buffered(self, sqlite_client):
+        """Test messages are buffered until flushed."""
+        await sqlite_client.add_message("session-1", "msg-1", "test@example.com", "customer", "Hello")
+
+        assert await self._count_committed(sqlite_client) == 0
+
+        await sqlite_client.flush()
+
+        assert await self._count_committed(sqlite_client) == 1
+
+    @pytest.mark.asyncio
+    async def test_add_message_flushes_at_batch_size(self, sqlite_client):
+        """Test reaching FLUSH_BATCH_SIZE writes the batch immediately."""
+        sqlite_client.FLUSH_BATCH_SIZE = 3
+
+        for i in range(3):
+            await sqlite_client.add_message("session-1", f"msg-{i}", "test@example.com", "customer", "Hello")
+
+        assert await self._count_committed(sqlite_client) == 3
+        assert sqlite_client._message_buffer == []
+
+        # The whole batch is stamped with a single flush timestamp
+        row = await sqlite_client.fetch_one("SELECT COUNT(DISTINCT created_at) FROM messages")
+        assert row[0] == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_sees_buffered_messages(self, sqlite_client):
+        """Test queries flush pending messages first."""
+        await sqlite_client.add_message(
+            "session-1", "msg-1", "test@example.com", "agent", "Hi there", metadata={"intent": "greeting"}
+        )
+
+        rows = await sqlite_client.fetch_all("SELECT message_id, metadata FROM messages")
+
+        assert [row[0] for row in rows] == ["msg-1"]
+        assert json.loads(rows[0][1]) == {"intent": "greeting"}
+
+    @pytest.mark.asyncio
+    async def test_add_message_non_str_metadata_keys(self, sqlite_client):
+        """Test metadata with non-str keys is logged with stringified keys."""
+        await sqlite_client.add_message(
+            "session-1", "msg-1", "test@example.com", "agent", "Hi there", metadata={1: "first", None: "none"}
+        )
+
+        messages = await sqlite_client.get_messages("session-1")
+
+        assert messages[0]["metadata"] == {"1": "first", "null": "none"}
+
+    @pytest.mark.asyncio
+    async def test_iter_rows_batches(self, sqlite_client):
+        """Test iter_rows yields every row as a plain tuple across fetchmany batches."""
+        for i in range(5):
+            await sqlite_client.add_message("session-1", f"msg-{i}", "test@example.com", "customer", "Hello")
+
+        rows = [
+            row
+            async for row in sqlite_client.iter_rows(
+                "SELECT message_id FROM messages WHERE session_id = ? ORDER BY id", ("session-1",), batch_size=2
+            )
+        ]
+
+        assert rows == [(f"msg-{i}",) for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_get_messages(self, sqlite_client):
+        """Test session messages come back in order with decoded metadata."""
+        await sqlite_client.add_message("session-1", "msg-1", "test@example.com", "customer", "Where is my order?")
+        await sqlite_client.add_message(
+            "session-1", "msg-2", "test@example.com", "agent", "It ships today.", metadata={"intent": "order_status"}
+        )
+        await sqlite_client.add_message("session-2", "msg-3", "other@example.com", "customer", "Hi")
+
+        messages = await sqlite_client.get_messages("session-1")
+
+        assert [m["message_id"] for m in messages] == ["msg-1", "msg-2"]
+        assert messages[0]["metadata"] == {}
+        assert messages[1]["metadata"] == {"intent": "order_status"}
+
+        row = await sqlite_client.fetch_one("SELECT typeof(metadata) FROM messages WHERE message_id = ?", ("msg-2",))
+        assert row[0] == "blob"
+
+    @pytest.mark.asyncio
+    async def test_get_messages_legacy_text_metadata(self, sqlite_client):
+        """Test metadata written as TEXT before the BLOB switch still decodes."""
+        await sqlite_client.execute(
+            "INSERT INTO messages (session_id, message_id, metadata, created_at) VALUES (?, ?, ?, ?)",
+            ("session-1", "msg-1", '{"legacy": true}', "2024-01-15T10:30:00"),
+        )
+
+        messages = await sqlite_client.get_messages("session-1")
+
+        assert messages[0]["metadata"] == {"legacy": True}
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_pending_messages(self, tmp_path):
+        """Test closing the client persists buffered messages."""
+        db_path = str(tmp_path / "conversations.db")
+        client = SQLiteClient(db_path=db_path)
+        await client.connect()
+        await client.add_message("session-1", "msg-1", "test@example.com", "customer", "Hello")
+        await client.close()
+
+        reopened = SQLiteClient(db_path=db_path)
+        row = await reopened.fetch_one("SELECT COUNT(*) FROM messages")
+        await reopened.close()
+
+        assert row[0] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_bounded_buffer(self, sqlite_client):
+        """Test rows are retried after a failed flush but the buffer stays capped."""
+        sqlite_client.MAX_BUFFERED_MESSAGES = 3
+        for i in range(5):
+            sqlite_client._message_buffer.append(("session-1", f"msg-{i}", "test@example.com", "customer", "Hi", b"{}"))
+
+        failing = AsyncMock(side_effect=sqlite3.OperationalError("disk I/O error"))
+        with patch.object(sqlite_client.conn, "executemany", failing):
+            with pytest.raises(sqlite3.OperationalError, match="disk I/O error"):
+                await sqlite_client.flush()
+
+        # The newest rows are kept for the next attempt
+        assert [row[1] for row in sqlite_client._message_buffer] == ["msg-2", "msg-3", "msg-4"]
+
+        await sqlite_client.flush()
+        assert await self._count_committed(sqlite_client) == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_rolls_back_partial_batch(self, sqlite_client):
+        """Test a retryable failure part-way through a batch doesn't store rows twice."""
+        for i in range(3):
+            await sqlite_client.add_message("session-1", f"msg-{i}", "test@example.com", "customer", "Hello")
+
+        real_executemany = sqlite_client.conn.executemany
+
+        async def fail_after_first_row(sql, rows):
+            await real_executemany(sql, rows[:1])
+            raise sqlite3.OperationalError("database is locked")
+
+        with patch.object(sqlite_client.conn, "executemany", side_effect=fail_after_first_row):
+            with pytest.raises(sqlite3.OperationalError):
+                await sqlite_client.flush()
+
+        await sqlite_client.flush()
+
+        rows = await sqlite_client.fetch_all("SELECT message_id FROM messages ORDER BY id")
+        assert [row[0] for row in rows] == ["msg-0", "msg-1", "msg-2"]
+
+    @pytest.mark.asyncio
+    async def test_flush_drops_rejected_row(self, sqlite_client):
+        """Test a row SQLite can't bind is dropped without blocking the rest of the batch."""
+        sqlite_client._message_buffer.extend(
+            [
+                ("session-1", "m1", "test@example.com", "customer", "Hello", b"{}"),
+                ("session-1", "bad", "test@example.com", "customer", {"bad": 1}, b"{}"),
+                ("session-1", "m2", "test@example.com", "customer", "Bye", b"{}"),
+            ]
+        )
+
+        await sqlite_client.flush()
+
+        rows = await sqlite_client.fetch_all("SELECT message_id FROM messages ORDER BY id")
+        assert [row[0] for row in rows] == ["m1", "m2"]
+        assert sqlite_client._message_buffer == []
+
+    @pytest.mark.asyncio
+    async def test_add_message_unbindable_content(self, sqlite_client):
+        """Test add_message raises for values sqlite3 can't bind instead of buffering them."""
+        with pytest.raises(sqlite3.ProgrammingError, match="parameter 5"):
+            await sqlite_client.add_message("session-1", "msg-1", "test@example.com", "customer", {"bad": 1})
+
+        assert sqlite_client._message_buffer == []
+
+    @pytest.mark.asyncio
+    async def test_flush_sqlite_persists_shared_client_buffer(self, sqlite_client):
+        """Test the module-level flush helper used by actors on shutdown."""
+        await sqlite_client.add_message("session-1", "msg-1", "test@example.com", "customer", "Hello")
+
+        with patch("storage.sqlite_client.sqlite_client", sqlite_client):
+            await flush_sqlite()
+
+        assert await self._count_committed(sqlite_client) == 1
+
+    @pytest.mark.asyncio
+    async def test_close_during_background_flush(self, tmp_path):
+        """Test closing while the background flush is mid-write still persists every message."""
+        import asyncio
+
+        db_path = str(tmp_path / "conversations.db")
+        client = SQLiteClient(db_path=db_path)
+        client.FLUSH_INTERVAL = 0.05
+        await client.connect()
+        real_executemany = client.conn.executemany
+
+        async def slow_executemany(sql, rows):
+            await asyncio.sleep(0.2)
+            return await real_executemany(sql, rows)
+
+        with patch.object(client.conn, "executemany", side_effect=slow_executemany):
+            for i in range(10):
+                await client.add_message("session-1", f"msg-{i}", "test@example.com", "customer", "Hello")
+            await asyncio.sleep(0.1)  # background flush is now inside executemany
+            await client.close()
+
+        reopened = SQLiteClient(db_path=db_path)
+        row = await reopened.fetch_one("SELECT COUNT(*) FROM messages")
+        await reopened.close()
+
+        assert row[0] == 10
+
+    @pytest.mark.asyncio
+    async def test_cancelled_flush_requeues_rows(self, sqlite_client):
+        """Test a flush cancelled mid-write rolls back and keeps its rows for the next flush."""
+        import asyncio
+
+        for i in range(3):
+            await sqlite_client.add_message("session-1", f"msg-{i}", "test@example.com", "customer", "Hello")
+        real_executemany = sqlite_client.conn.executemany
+
+        async def insert_then_stall(sql, rows):
+            await real_executemany(sql, rows)
+            await asyncio.sleep(10)
+
+        with patch.object(sqlite_client.conn, "executemany", side_effect=insert_then_stall):
+            task = asyncio.create_task(sqlite_client.flush())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        assert len(sqlite_client._message_buffer) == 3
+        await sqlite_client.flush()
+        assert await self._count_committed(sqlite_client) == 3
+
+    @pytest.mark.asyncio
+    async def test_periodic_flush(self, tmp_path):
+        """Test the background task flushes the buffer on its interval."""
+        import asyncio
+
+        client = SQLiteClient(db_path=str(tmp_path / "conversations.db"))
+        client.FLUSH_INTERVAL = 0.01
+        await client.connect()
+        try:
+            await client.add_message("session-1", "msg-1", "test@example.com", "customer", "Hello")
+            await asyncio.sleep(0.1)
+
+            assert await self._count_committed(client) == 1
+        finally:
+            await client.close()
@@ -5,13 +5,21 @@ Tests the simplified Redis client for context caching functionality
 used by the ContextRetriever actor.
 """
 
-import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import msgpack
 import pytest
 from storage.redis_client_simple import SimplifiedRedisClient, get_simplified_redis_client, init_simplified_redis
 
 
+def _mock_pipeline(results):
+    """Build a mock Redis pipeline whose execute() returns the given results."""
+    pipe = MagicMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.execute = AsyncMock(return_value=results)
+    return pipe
+
+
 class TestSimplifiedRedisClient:
     """Test cases for SimplifiedRedisClient."""
 
@@ -26,23 +34,36 @@ class TestSimplifiedRedisClient:
 
     def test_redis_client_custom_initialization(self):
         """Test Redis client with custom parameters."""
-        client = SimplifiedRedisClient(redis_url="redis://custom:6380", db=1)
+        client = SimplifiedRedisClient(redis_url="redis://custom:6380", db=1, max_connections=8)
         assert client.redis_url == "redis://custom:6380"
         assert client.db == 1
+        assert client.max_connections == 8
+
+    def test_redis_client_url_from_env(self, monkeypatch):
+        """Test the Redis URL falls back to REDIS_URL, including unix socket URLs."""
+        monkeypatch.setenv("REDIS_URL", "unix:///var/run/redis/redis.sock")
+
+        client = SimplifiedRedisClient()
+        assert client.redis_url == "unix:///var/run/redis/redis.sock"
 
     @pytest.mark.asyncio
     async def test_connect_success(self):
         """Test successful Redis connection."""
         client = SimplifiedRedisClient()
 
-        with patch("redis.asyncio.from_url") as mock_from_url:
+        with patch("redis.asyncio.BlockingConnectionPool.from_url") as mock_from_url, patch(
+            "redis.asyncio.Redis.from_pool"
+        ) as mock_from_pool:
             mock_redis = AsyncMock()
-            mock_from_url.return_value = mock_redis
+            mock_from_pool.return_value = mock_redis
             mock_redis.ping = AsyncMock()
 
             await client.connect()
 
-            mock_from_url.assert_called_once_with(client.redis_url, db=0, decode_responses=True)
+            mock_from_url.assert_called_once_with(
+                client.redis_url, db=0, decode_responses=False, max_connections=64, timeout=5
+            )
+            mock_from_pool.assert_called_once_with(mock_from_url.return_value)
             mock_redis.ping.assert_called_once()
             assert client.redis == mock_redis
 
@@ -51,9 +72,9 @@ class TestSimplifiedRedisClient:
         """Test Redis connection failure."""
         client = SimplifiedRedisClient()
 
-        with patch("redis.asyncio.from_url") as mock_from_url:
+        with patch("redis.asyncio.Redis.from_pool") as mock_from_pool:
             mock_redis = AsyncMock()
-            mock_from_url.return_value = mock_redis
+            mock_from_pool.return_value = mock_redis
             mock_redis.ping = AsyncMock(side_effect=Exception("Connection failed"))
 
             with pytest.raises(Exception, match="Connection failed"):
@@ -90,8 +111,8 @@ class TestSimplifiedRedisClient:
         await client.cache_customer_context(email, context_data)
 
         expected_key = f"context:{email}"
-        expected_value = json.dumps(context_data)
-        client.redis.setex.assert_called_once_with(expected_key, 7200, expected_value)
+        expected_value = msgpack.packb(context_data, use_bin_type=True)
+        client.redis.set.assert_called_once_with(expected_key, expected_value, ex=7200)
 
     @pytest.mark.asyncio
     async def test_cache_customer_context_custom_ttl(self):
@@ -106,8 +127,8 @@ class TestSimplifiedRedisClient:
         await client.cache_customer_context(email, context_data, ttl=custom_ttl)
 
         expected_key = f"context:{email}"
-        expected_value = json.dumps(context_data)
-        client.redis.setex.assert_called_once_with(expected_key, custom_ttl, expected_value)
+        expected_value = msgpack.packb(context_data, use_bin_type=True)
+        client.redis.set.assert_called_once_with(expected_key, expected_value, ex=custom_ttl)
 
     @pytest.mark.asyncio
     async def test_get_customer_context_exists(self):
@@ -116,7 +137,7 @@ class TestSimplifiedRedisClient:
         client.redis = AsyncMock()
 
         context_data = {"customer_id": "123", "tier": "gold"}
-        client.redis.get.return_value = json.dumps(context_data)
+        client.redis.get.return_value = msgpack.packb(context_data)
 
         email = "test@example.com"
         result = await client.get_customer_context(email)
@@ -125,6 +146,38 @@ class TestSimplifiedRedisClient:
         client.redis.get.assert_called_once_with(expected_key)
         assert result == context_data
 
+    @pytest.mark.asyncio
+    async def test_customer_context_large_payload_roundtrip(self):
+        """Test large contexts are compressed on write and transparently restored on read."""
+        client = SimplifiedRedisClient()
+        client.redis = AsyncMock()
+
+        context_data = {"orders": [{"id": i, "status": "shipped"} for i in range(200)]}
+        email = "test@example.com"
+
+        await client.cache_customer_context(email, context_data)
+
+        stored = client.redis.set.call_args.args[1]
+        assert stored[:1] == b"\x01"
+        assert len(stored) < len(msgpack.packb(context_data, use_bin_type=True))
+
+        client.redis.get.return_value = stored
+        assert await client.get_customer_context(email) == context_data
+        client.redis.delete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_customer_context_non_str_keys_roundtrip(self):
+        """Test contexts with non-str keys are not mistaken for corrupt cache entries."""
+        client = SimplifiedRedisClient()
+        client.redis = AsyncMock()
+        context_data = {1: "x", None: {"nested": True}}
+
+        await client.cache_customer_context("test@example.com", context_data)
+        client.redis.get.return_value = client.redis.set.call_args.args[1]
+
+        assert await client.get_customer_context("test@example.com") == context_data
+        client.redis.delete.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_get_customer_context_not_exists(self):
         """Test getting non-existent customer context."""
@@ -139,10 +192,10 @@ class TestSimplifiedRedisClient:
 
     @pytest.mark.asyncio
     async def test_get_customer_context_corrupted_data(self):
-        """Test handling corrupted JSON data."""
+        """Test handling corrupted cached data."""
         client = SimplifiedRedisClient()
         client.redis = AsyncMock()
-        client.redis.get.return_value = "invalid json"
+        client.redis.get.return_value = b"invalid json"
 
         email = "test@example.com"
         result = await client.get_customer_context(email)
@@ -207,14 +260,13 @@ class TestSimplifiedRedisClient:
         """Test health check when Redis is healthy."""
         client = SimplifiedRedisClient()
         client.redis = AsyncMock()
-        client.redis.set = AsyncMock()
-        client.redis.get.return_value = "ok"
-        client.redis.delete = AsyncMock()
-        client.redis.info.return_value = {
+        info = {
             "connected_clients": 5,
             "used_memory_human": "1.2M",
             "uptime_in_seconds": 3600
         }
+        pipe = _mock_pipeline([True, b"ok", 1, info])
+        client.redis.pipeline = MagicMock(return_value=pipe)
 
         result = await client.health_check()
 
@@ -223,6 +275,8 @@ class TestSimplifiedRedisClient:
         assert result["connected_clients"] == 5
         assert result["used_memory"] == "1.2M"
         assert result["uptime"] == 3600
+        client.redis.pipeline.assert_called_once_with(transaction=False)
+        pipe.execute.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_health_check_unhealthy(self):
@@ -300,12 +354,12 @@ class TestSimplifiedRedisClientIntegration:
             await client.cache_customer_context(email, context)
 
             # Retrieve cached context
-            client.redis.get.return_value = json.dumps(context)
+            client.redis.get.return_value = msgpack.packb(context)
             result = await client.get_customer_context(email)
             assert result == context
 
             # Update context
-            client.redis.get.return_value = json.dumps(context)
+            client.redis.get.return_value = msgpack.packb(context)
             updated = await client.update_customer_context(email, {"tier": "gold"})
             assert updated is True
 
@@ -342,5 +396,5 @@ class TestSimplifiedRedisClientIntegration:
         await client.cache_customer_context(email, complex_context)
 
         expected_key = f"context:{email}"
-        expected_value = json.dumps(complex_context)
-        client.redis.setex.assert_called_once_with(expected_key, 7200, expected_value)
+        expected_value = msgpack.packb(complex_context, use_bin_type=True)
+        client.redis.set.assert_called_once_with(expected_key, expected_value, ex=7200)